@@ -0,0 +1,113 @@
+"""API client helpers shared by the Streamlit UI"""
+import os
+import re
+from typing import Dict, Iterator
+
+import orjson
+import requests
+import streamlit as st
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+__all__ = [
+    "API_BASE_URL",
+    "clean_response_text",
+    "ask_roboadvisor",
+    "refresh_roboadvisor",
+    "open_roboadvisor_stream",
+    "iter_roboadvisor_stream",
+]
+
+# Load environment variables
+load_dotenv()
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'\.\s+')
+
+def clean_response_text(text: str) -> str:
+    """Clean response text for better display in Streamlit"""
+    if not text:
+        return text
+    
+    # Remove any weird Unicode characters that might cause display issues
+    text = text.encode('ascii', 'ignore').decode('ascii')
+    
+    # Normalize whitespace
+    text = _WHITESPACE_RE.sub(' ', text)
+    
+    # Fix paragraph breaks (whitespace is already collapsed, so no runs of blank lines remain)
+    text = _SENTENCE_END_RE.sub('.\n\n', text)
+    
+    return text.strip()
+
+@st.cache_resource
+def _http() -> requests.Session:
+    """Shared keep-alive session so reruns reuse pooled connections to the API"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _ask_roboadvisor_uncached(query: str, refresh: bool = False) -> dict:
+    # Fail fast on connect to a dead backend, but allow the full read budget for the LLM
+    response = _http().post(f"{API_BASE_URL}/chat", json={"query": query, "refresh": refresh}, timeout=(3, 30))
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+# Per-query generation, bumped on refresh so only that query's cached answer is replaced
+_GENERATIONS: Dict[str, int] = {}
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=256)
+def _ask_roboadvisor_cached(query: str, generation: int = 0, _refresh: bool = False) -> dict:
+    # Errors propagate out of here, so Streamlit never caches a failed call.
+    # _refresh is left out of the cache key, so the refreshed answer serves later plain asks.
+    return _ask_roboadvisor_uncached(query, refresh=_refresh)
+
+def ask_roboadvisor(query: str) -> dict:
+    try:
+        return _ask_roboadvisor_cached(query, _GENERATIONS.get(query, 0))
+    except Exception as e:
+        return {"error": str(e)}
+
+def refresh_roboadvisor(query: str) -> dict:
+    """Ask again past every cache (here and on the server), for when the cached market data is too stale"""
+    generation = _GENERATIONS[query] = _GENERATIONS.get(query, 0) + 1
+    try:
+        return _ask_roboadvisor_cached(query, generation, _refresh=True)
+    except Exception as e:
+        return {"error": str(e)}
+
+def open_roboadvisor_stream(query: str) -> requests.Response:
+    """Start a streamed /chat request; returns once the server begins sending the response"""
+    response = _http().post(f"{API_BASE_URL}/chat/stream", json={"query": query}, stream=True, timeout=(3, 120))
+    response.raise_for_status()
+    return response
+
+def iter_roboadvisor_stream(stream: requests.Response, result: dict) -> Iterator[str]:
+    """
+    Yield response text deltas from a /chat/stream response.
+    The full /chat response from the final `done` event is stored in result.
+    """
+    event = None
+    for line in stream.iter_lines(decode_unicode=True):
+        if not line:
+            event = None
+        elif line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            payload = orjson.loads(line[len("data: "):])
+            if event == "done":
+                result.update(payload)
+            else:
+                yield payload["delta"]
+    
+    if not result:
+        raise ConnectionError("Response stream ended before it completed")
@@ -1,44 +1,21 @@
-import os
-import requests
+import hashlib
+import io
+import json
 import streamlit as st
-import re
-from collections import Counter
-import matplotlib.pyplot as plt
-import pandas as pd
-from dotenv import load_dotenv
-from wordcloud import WordCloud
-import seaborn as sns
-
-# Load environment variables
-load_dotenv()
-
-API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
-
-def clean_response_text(text: str) -> str:
-    """Clean response text for better display in Streamlit"""
-    if not text:
-        return text
-    
-    # Remove any weird Unicode characters that might cause display issues
-    text = re.sub(r'[^\x00-\x7F]+', '', text)
-    
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Fix paragraph breaks
-    text = re.sub(r'\.\s+', '.\n\n', text)
-    text = re.sub(r'\n\n+', '\n\n', text)
-    
-    return text.strip()
+from collections import Counter, deque
 
-def ask_roboadvisor(query: str) -> dict:
-    try:
-        response = requests.post(f"{API_BASE_URL}/chat", json={"query": query}, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+from _api import clean_response_text, ask_roboadvisor, refresh_roboadvisor, open_roboadvisor_stream, iter_roboadvisor_stream
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def _pretty_json(cache_key: str, _obj) -> str:
+    """Pretty-print a context section once per (symbol, fetch timestamp, source) key"""
+    return json.dumps(_obj, indent=2, default=str)
+
+def _fingerprint(data: dict) -> str:
+    """Stable content hash for caching on nested API payloads"""
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+@st.cache_data(show_spinner=False, hash_funcs={dict: _fingerprint})
 def analyze_news_sentiment(news_data):
     """
     Analyze sentiment from the news_sentiment section.
@@ -47,18 +24,25 @@ def analyze_news_sentiment(news_data):
     if not news_data or "articles" not in news_data:
         return None, None
 
-    # Extract sentiment labels and summaries
-    sentiments = []
-    summaries = []
-    for article in news_data["articles"]:
-        sentiments.append(article.get("overall_sentiment_label", "Neutral"))
-        summaries.append(article.get("summary", ""))
+    articles = news_data["articles"]
 
-    # Count sentiment occurrences
-    sentiment_counts = Counter(sentiments)
+    # Count sentiment labels straight from the articles, no intermediate list
+    sentiment_counts = Counter(article.get("overall_sentiment_label", "Neutral") for article in articles)
+    summaries = [article.get("summary", "") for article in articles]
 
     return sentiment_counts, summaries
 
+# Alpha Vantage sentiment labels, bearish to bullish
+SENTIMENT_COLORS = {
+    "Bearish": "red",
+    "Somewhat-Bearish": "salmon",
+    "Negative": "red",
+    "Neutral": "gray",
+    "Positive": "green",
+    "Somewhat-Bullish": "lightgreen",
+    "Bullish": "green",
+}
+
 def plot_sentiment_distribution(sentiment_counts):
     """
     Plot a bar chart for sentiment distribution.
@@ -67,14 +51,33 @@ def plot_sentiment_distribution(sentiment_counts):
         st.info("No sentiment data available.")
         return
 
-    # Bar chart for sentiment distribution
-    labels, values = zip(*sentiment_counts.items())
-    fig, ax = plt.subplots()
-    ax.bar(labels, values, color=["green", "red", "gray"])
-    ax.set_title("News Sentiment Distribution")
-    ax.set_xlabel("Sentiment")
-    ax.set_ylabel("Number of Articles")
-    st.pyplot(fig)
+    import altair as alt
+
+    # Canonical bearish-to-bullish order so bars and colors line up regardless of feed order
+    labels = [label for label in SENTIMENT_COLORS if label in sentiment_counts]
+    labels += [label for label in sentiment_counts if label not in SENTIMENT_COLORS]
+    colors = [SENTIMENT_COLORS.get(label, "gray") for label in labels]
+
+    # Bar chart for sentiment distribution (rendered client-side by Vega-Lite)
+    chart_data = alt.Data(values=[
+        {"Sentiment": label, "Number of Articles": sentiment_counts[label]} for label in labels
+    ])
+    chart = alt.Chart(chart_data).mark_bar().encode(
+        x=alt.X("Sentiment:N", sort=labels),
+        y=alt.Y("Number of Articles:Q"),
+        color=alt.Color("Sentiment:N", scale=alt.Scale(domain=labels, range=colors), legend=None)
+    ).properties(title="News Sentiment Distribution")
+    st.altair_chart(chart, use_container_width=True)
+
+@st.cache_data(show_spinner=False)
+def _wordcloud_png(text: str) -> bytes:
+    """Lay out the word cloud once per distinct text and return it as PNG bytes"""
+    from wordcloud import WordCloud
+
+    wordcloud = WordCloud(width=800, height=400, background_color="white").generate(text)
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format="PNG")
+    return buffer.getvalue()
 
 def plot_word_cloud(summaries):
     """
@@ -84,12 +87,7 @@ def plot_word_cloud(summaries):
         st.info("No article summaries available.")
         return
 
-    text = " ".join(summaries)
-    wordcloud = WordCloud(width=800, height=400, background_color="white").generate(text)
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation="bilinear")
-    ax.axis("off")
-    st.pyplot(fig)
+    st.image(_wordcloud_png(" ".join(summaries)), use_column_width=True)
 
 def plot_sentiment_over_time(news_data):
     """
@@ -108,27 +106,32 @@ def plot_sentiment_heatmap(news_data):
         st.info("No sentiment data available.")
         return
 
-    # Extract topics and sentiments
-    topic_sentiment = []
-    for article in news_data["articles"]:
-        topics = article.get("topics", [])
-        sentiment = article.get("overall_sentiment_label", "Neutral")
-        for topic in topics:
-            topic_sentiment.append((topic, sentiment))
+    import altair as alt
+
+    # Count (topic, sentiment) pairs directly; no intermediate DataFrame is needed
+    pair_counts = Counter(
+        (topic, article.get("overall_sentiment_label") or "Neutral")
+        for article in news_data["articles"]
+        for topic in article.get("topics") or []
+    )
 
-    if not topic_sentiment:
+    if not pair_counts:
         st.info("No topics available for sentiment data.")
         return
 
-    # Create a DataFrame
-    df = pd.DataFrame(topic_sentiment, columns=["Topic", "Sentiment"])
-    sentiment_counts = df.groupby(["Topic", "Sentiment"]).size().unstack(fill_value=0)
+    sentiment_counts = alt.Data(values=[
+        {"Topic": topic, "Sentiment": sentiment, "Count": count}
+        for (topic, sentiment), count in pair_counts.items()
+    ])
 
     # Plot the heatmap
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.heatmap(sentiment_counts, annot=True, fmt="d", cmap="coolwarm", ax=ax)
-    ax.set_title("Sentiment Distribution by Topic")
-    st.pyplot(fig)
+    base = alt.Chart(sentiment_counts).encode(x=alt.X("Sentiment:N"), y=alt.Y("Topic:N"))
+    heatmap = base.mark_rect().encode(
+        color=alt.Color("Count:Q", scale=alt.Scale(scheme="redblue", reverse=True))
+    )
+    labels = base.mark_text().encode(text="Count:Q")
+    chart = (heatmap + labels).properties(title="Sentiment Distribution by Topic")
+    st.altair_chart(chart, use_container_width=True)
 
 def plot_sentiment_histogram(sentiment_scores):
     """
@@ -138,53 +141,83 @@ def plot_sentiment_histogram(sentiment_scores):
         st.info("No sentiment scores available.")
         return
 
-    fig, ax = plt.subplots()
-    ax.hist(sentiment_scores, bins=20, color="blue", alpha=0.7)
-    ax.set_title("Sentiment Score Distribution")
-    ax.set_xlabel("Sentiment Score")
-    ax.set_ylabel("Frequency")
-    st.pyplot(fig)
+    import altair as alt
+    import pandas as pd
+
+    chart = alt.Chart(pd.DataFrame({"Sentiment Score": sentiment_scores})).mark_bar(opacity=0.7).encode(
+        x=alt.X("Sentiment Score:Q", bin=alt.Bin(maxbins=20)),
+        y=alt.Y("count()", title="Frequency")
+    ).properties(title="Sentiment Score Distribution")
+    st.altair_chart(chart, use_container_width=True)
 
 st.set_page_config(page_title="AI Wealth Advisor", page_icon="💼")
 st.title("💼 AI Wealth Advisor")
 
+# Assistant messages are cleaned once when stored, not on every rerun
+WELCOME_MESSAGE = clean_response_text("👋 Hi! I'm your AI Wealth Advisor. Ask me about any stock!")
+
+# Only the most recent messages are kept, which bounds the per-rerun display cost
+MAX_CHAT_MESSAGES = 40
+
+def new_chat_history() -> deque:
+    return deque([{"role": "assistant", "content": WELCOME_MESSAGE}], maxlen=MAX_CHAT_MESSAGES)
+
 # Initialize chat
 if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role": "assistant", "content": "👋 Hi! I'm your AI Wealth Advisor. Ask me about any stock!"}
-    ]
+    st.session_state.messages = new_chat_history()
 
 # Display messages
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
-        if message["role"] == "assistant":
-            st.write(clean_response_text(message["content"]))
-        else:
-            st.write(message["content"])
+        st.write(message["content"])
+
+def queue_example_query():
+    """Form callback: hand the chosen example to the chat flow on the submit rerun"""
+    st.session_state.example_query = st.session_state.example_choice
 
-# Chat input
-if prompt := st.chat_input("Ask about any stock..."):
+# Chat input (a submitted sidebar example arrives through session state)
+example_query = st.session_state.pop("example_query", None)
+if prompt := st.chat_input("Ask about any stock...") or example_query:
     st.session_state.messages.append({"role": "user", "content": prompt})
     
     with st.chat_message("user"):
         st.write(prompt)
     
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = ask_roboadvisor(prompt)
+        # One slot for the answer, so a fallback replaces any partial streamed text instead of following it
+        answer_slot = st.empty()
+        response = {}
+        if prompt != example_query:
+            try:
+                with st.spinner("Thinking..."):
+                    stream = open_roboadvisor_stream(prompt)
+                # Render tokens as they arrive
+                with stream, answer_slot.container():
+                    st.write_stream(iter_roboadvisor_stream(stream, response))
+            except Exception:
+                response = {}
+                answer_slot.empty()
+        
+        if not response:
+            # Examples, or streaming unavailable/interrupted: use the cached blocking endpoint
+            with st.spinner("Thinking..."):
+                response = ask_roboadvisor(prompt)
+            if "error" not in response:
+                answer_slot.write(clean_response_text(response["response"]))
         
         if "error" in response:
             error_msg = f"❌ Error: {response['error']}"
             st.error(error_msg)
-            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+            st.session_state.messages.append({"role": "assistant", "content": clean_response_text(error_msg)})
         else:
-            # Clean and display the main response
+            # Store the cleaned response for future reruns
             cleaned_response = clean_response_text(response["response"])
-            st.write(cleaned_response)
-            st.session_state.messages.append({"role": "assistant", "content": cleaned_response})
+            message = {"role": "assistant", "content": cleaned_response}
+            st.session_state.messages.append(message)
             
-            # Store the latest response data for the data tab
+            # Store the latest response data for the data tab, and its message so Refresh can update it
             st.session_state.latest_response = response
+            st.session_state.latest_message = message
 
 # Sidebar
 with st.sidebar:
@@ -196,24 +229,25 @@ with st.sidebar:
         "Microsoft outlook?"
     ]
     
-    for query in examples:
-        if st.button(query, key=query):
-            st.session_state.messages.append({"role": "user", "content": query})
-            st.rerun()
+    # A form batches the choice so only submitting triggers a rerun
+    with st.form("examples"):
+        st.radio("Examples", examples, key="example_choice", label_visibility="collapsed")
+        st.form_submit_button("Ask", on_click=queue_example_query)
     
     if st.button("Clear Chat"):
-        st.session_state.messages = [
-            {"role": "assistant", "content": "👋 Hi! I'm your AI Wealth Advisor. Ask me about any stock!"}
-        ]
+        st.session_state.messages = new_chat_history()
         st.rerun()
 
 # Data tab at the bottom
-if hasattr(st.session_state, 'latest_response') and st.session_state.latest_response:
+@st.fragment
+def render_market_data(response_data: dict):
+    """
+    Render the market data tabs for the latest response.
+    As a fragment, interacting with widgets in here reruns only this section.
+    """
     st.markdown("---")
     st.header("📊 Market Data Analysis")
     
-    response_data = st.session_state.latest_response
-    
     # Create tabs for different data views
     tab1, tab2, tab3 = st.tabs(["📈 Stock Data", "🔍 Comprehensive Data", "⚙️ Debug Info"])
     
@@ -235,29 +269,47 @@ if hasattr(st.session_state, 'latest_response') and st.session_state.latest_resp
             volume = stock_dict.get('volume', 0) or 0
             previous_close = stock_dict.get('previous_close', 0) or 0
             
+            # Format each value once; the metrics and the details JSON share the strings
+            price_text = f"${price:.2f}"
+            change_text = f"${change:.2f}"
+            volume_text = f"{volume:,}"
+            stock_details = {
+                "Symbol": stock_dict.get("symbol", "N/A"),
+                "Price": price_text,
+                "Previous Close": f"${previous_close:.2f}",
+                "Change": change_text,
+                "Change %": str(stock_dict.get('change_percent', 'N/A')),
+                "Volume": volume_text,
+                "Source": str(stock_dict.get('source', 'N/A'))
+            }
+            
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Price", f"${price:.2f}")
+                st.metric("Price", price_text)
             with col2:
-                st.metric("Change", f"${change:.2f}", delta=f"{change:.2f}")
+                st.metric("Change", change_text, delta=f"{change:.2f}")
             with col3:
-                st.metric("Volume", f"{volume:,}")
+                st.metric("Volume", volume_text)
             
             st.subheader("Stock Details")
             try:
-                st.json({
-                    "Symbol": stock_dict.get("symbol", "N/A"),
-                    "Price": f"${price:.2f}",
-                    "Previous Close": f"${previous_close:.2f}",
-                    "Change": f"${change:.2f}",
-                    "Change %": str(stock_dict.get('change_percent', 'N/A')),
-                    "Volume": f"{volume:,}",
-                    "Source": str(stock_dict.get('source', 'N/A'))
-                })
+                st.json(stock_details)
             except Exception as e:
                 st.error(f"Error displaying stock details: {e}")
                 st.write("Raw stock data:")
                 st.write(stock_dict)
+            
+            # Responses are cached here and on the server; let the user force fresh market data and a new answer
+            if st.button("🔄 Refresh", help="Skip cached answers and fetch the latest market data for this query"):
+                refreshed = refresh_roboadvisor(response_data.get("original_query", ""))
+                if "error" in refreshed:
+                    st.error(f"❌ Error: {refreshed['error']}")
+                else:
+                    st.session_state.latest_response = refreshed
+                    # The message dict is shared with the chat history, so the refreshed answer shows in place
+                    if "latest_message" in st.session_state:
+                        st.session_state.latest_message["content"] = clean_response_text(refreshed["response"])
+                    st.rerun()
         else:
             st.info("No stock data available for the latest query.")
     
@@ -273,15 +325,20 @@ if hasattr(st.session_state, 'latest_response') and st.session_state.latest_resp
                 if data_sources and isinstance(data_sources, list):
                     st.write("**Data Sources Available:**", ", ".join(data_sources))
 
-                    # Display each data source
-                    for source in data_sources:
-                        if source in context and context[source]:
-                            with st.expander(f"📊 {source.replace('_', ' ').title()}"):
-                                try:
-                                    st.json(context[source])
-                                except Exception as e:
-                                    st.error(f"Error displaying {source}: {e}")
-                                    st.write(context[source])
+                    # Display only the selected data source so the others aren't serialized
+                    available_sources = [source for source in data_sources if context.get(source)]
+                    if available_sources:
+                        source = st.selectbox(
+                            "📊 Inspect data source",
+                            available_sources,
+                            format_func=lambda name: name.replace('_', ' ').title()
+                        )
+                        try:
+                            cache_key = f"{context.get('symbol')}:{context.get('timestamp')}:{source}"
+                            st.code(_pretty_json(cache_key, context[source]), language="json")
+                        except Exception as e:
+                            st.error(f"Error displaying {source}: {e}")
+                            st.write(context[source])
 
                     # Check if "news_sentiment" is one of the data sources
                     if "news_sentiment" in data_sources:
@@ -303,8 +360,7 @@ if hasattr(st.session_state, 'latest_response') and st.session_state.latest_resp
                         # Display article summaries 
                         if summaries:
                             st.subheader("Article Summaries")
-                            for summary in summaries:
-                                st.write(f"- {summary}")
+                            st.markdown("\n".join(f"- {summary}" for summary in summaries if summary))
                 else:
                     st.info("No data sources available in comprehensive context.")
             else:
@@ -337,4 +393,7 @@ if hasattr(st.session_state, 'latest_response') and st.session_state.latest_resp
         except Exception as e:
             st.error(f"Error displaying debug info: {e}")
             st.write("Raw debug info:")
-            st.write(debug_info)
\ No newline at end of file
+            st.write(debug_info)
+
+if st.session_state.get("latest_response"):
+    render_market_data(st.session_state.latest_response)
@@ -1,15 +1,131 @@
 """Alpha Vantage API integrations for comprehensive market data"""
-import requests
+import asyncio
+import importlib.util
+import logging
+import httpx
+import orjson
 import os
+import re
+import sys
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from dotenv import load_dotenv
-from functools import lru_cache
+
+from .cache import TTLCache
+from .rate_limit import TokenBucket
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Cache lifetimes per endpoint, matched to how often Alpha Vantage updates each data type
+CACHE_TTLS = {
+    "GLOBAL_QUOTE": 60,
+    "NEWS_SENTIMENT": 15 * 60,
+    "OVERVIEW": 24 * 60 * 60,
+    "ETF_PROFILE": 24 * 60 * 60,
+    "EARNINGS": 24 * 60 * 60,
+    "CASH_FLOW": 24 * 60 * 60,
+    "BALANCE_SHEET": 24 * 60 * 60,
+    "INCOME_STATEMENT": 24 * 60 * 60,
+}
+
+_CACHE = TTLCache()
+
+# Requests per minute allowed by the Alpha Vantage plan (free keys: 5/min). Calls queue for a
+# token instead of spending quota on "API call frequency" errors; cache hits don't use tokens.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("ALPHA_VANTAGE_RATE_LIMIT", "5"))
+RATE_LIMIT_MAX_WAIT = 10
+_BUCKET = TokenBucket(rate=RATE_LIMIT_PER_MINUTE / 60, capacity=max(RATE_LIMIT_PER_MINUTE, 1))
+
+# Cache keys with a background refresh running, so a stale entry is only refetched once
+_REFRESHING = set()
+# Strong references to background refresh tasks; the event loop only keeps weak ones
+_BACKGROUND_TASKS = set()
+
+async def _store_async(function: str, cache_key: str, data: Dict) -> None:
+    # Entries stay servable for one extra TTL past expiry while a refresh runs in the background
+    ttl = CACHE_TTLS.get(function, 60)
+    await _CACHE.set_async(cache_key, data, ttl, stale_for=ttl)
+
+def _claim_refresh(cache_key: str) -> bool:
+    if cache_key in _REFRESHING:
+        return False
+    _REFRESHING.add(cache_key)
+    return True
+
+def _release_refresh(cache_key: str) -> None:
+    _REFRESHING.discard(cache_key)
+
+# Upper bound on any one endpoint in a comprehensive fetch (including rate-limit waits), so a
+# slow endpoint only drops its own section instead of stalling the whole context
+ENDPOINT_TIMEOUT = 15
+
+# Shared async client so concurrent endpoint calls reuse pooled keep-alive connections.
+# With h2 installed (httpx[http2]) the per-symbol fan-out multiplexes over a single HTTP/2 connection.
+_ASYNC_HTTP = httpx.AsyncClient(
+    http2=importlib.util.find_spec("h2") is not None,
+    timeout=10,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+)
+
+# Comprehensive fetches currently running, keyed by symbol, so concurrent callers share one fan-out
+_INFLIGHT_ASYNC: Dict[str, "asyncio.Task"] = {}
+_PENDING_REQUESTS: Dict[str, "asyncio.Task"] = {}
+
+# (function, result key, parser method) per endpoint; premium sources are skipped on the demo key
+_BASE_DATA_SOURCES = (
+    ("GLOBAL_QUOTE", "stock_quote", "_parse_stock_quote"),
+    ("OVERVIEW", "company_overview", "_parse_company_overview"),
+    ("NEWS_SENTIMENT", "news_sentiment", "_parse_news_sentiment"),
+)
+_PREMIUM_DATA_SOURCES = (
+    ("ETF_PROFILE", "etf_profile", "_parse_etf_profile"),
+    ("EARNINGS", "earnings", "_parse_earnings"),
+    ("CASH_FLOW", "cash_flow", "_parse_financial_data"),
+    ("BALANCE_SHEET", "balance_sheet", "_parse_financial_data"),
+    ("INCOME_STATEMENT", "income_statement", "_parse_financial_data"),
+)
+
+# Fixed request params per endpoint; only the symbol is filled in per call
+_PARAMS_TEMPLATE = {
+    function: {"function": function} for function, _, _ in _BASE_DATA_SOURCES + _PREMIUM_DATA_SOURCES
+}
+_PARAMS_TEMPLATE["NEWS_SENTIMENT"]["limit"] = "5"
+_SYMBOL_PARAM = {"NEWS_SENTIMENT": "tickers"}
+
+# Top-level keys of Alpha Vantage's non-data replies: errors, and the per-minute ("Note") and
+# daily ("Information") quota notices, which arrive with HTTP 200 and must never be cached
+_ERROR_KEYS = frozenset({"Error Message", "Note", "Information"})
+_QUOTA_RE = re.compile(r"rate limit|call frequency|requests per (?:day|minute)", re.IGNORECASE)
+
+# Statement endpoints return years of reports; only the slice the parsers read is kept and cached
+_KEPT_REPORTS = {
+    "EARNINGS": ("quarterlyEarnings", 4),
+    "CASH_FLOW": ("quarterlyReports", 1),
+    "BALANCE_SHEET": ("quarterlyReports", 1),
+    "INCOME_STATEMENT": ("quarterlyReports", 1),
+}
+
+# GLOBAL_QUOTE / OVERVIEW response keys read by the parsers
+_QUOTE_PRICE = "05. price"
+_QUOTE_VOLUME = "06. volume"
+_QUOTE_CHANGE = "09. change"
+_QUOTE_CHANGE_PERCENT = "10. change percent"
+_PERCENT_STRIP = str.maketrans("", "", "%")
+_OVERVIEW_FIELDS = (
+    ("symbol", "Symbol"), ("name", "Name"), ("sector", "Sector"), ("industry", "Industry"),
+    ("market_cap", "MarketCapitalization"), ("pe_ratio", "PERatio"), ("eps", "EPS"),
+    ("dividend_yield", "DividendYield"), ("week_52_high", "52WeekHigh"),
+    ("week_52_low", "52WeekLow"), ("revenue_ttm", "RevenueTTM"),
+)
+
+# Fixed fields of the offline fallback; only the symbol-specific text is filled in per call
+_MOCK_OVERVIEW = {"sector": "Technology", "industry": "Software", "market_cap": "2500000000", "pe_ratio": "25.4"}
+_MOCK_ARTICLE = {"sentiment": "Positive", "source": "Mock Financial News"}
+
 class AlphaVantageClient:
-    __slots__ = ['api_key', 'base_url', 'is_demo']
+    __slots__ = ['api_key', 'base_url', 'is_demo', 'data_sources']
     
     def __init__(self):
         self.api_key = os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
@@ -17,82 +133,149 @@ class AlphaVantageClient:
         self.is_demo = self.api_key == "demo"
         
         if self.is_demo:
-            print("⚠️  Using demo Alpha Vantage API key - functionality will be limited")
+            logger.warning("⚠️  Using demo Alpha Vantage API key - functionality will be limited")
+        else:
+            logger.info("✅ Using Alpha Vantage API key: %s...", self.api_key[:8])
+        
+        # Resolve parsers once per client instead of on every fetch
+        sources = _BASE_DATA_SOURCES if self.is_demo else _BASE_DATA_SOURCES + _PREMIUM_DATA_SOURCES
+        self.data_sources = tuple((function, key, getattr(self, parser)) for function, key, parser in sources)
+    
+    def _check_response(self, data: Dict) -> Optional[Dict]:
+        """Return the payload, or None if Alpha Vantage answered with an error or quota note"""
+        if _ERROR_KEYS.isdisjoint(data):
+            return data
+        
+        if "Error Message" in data:
+            logger.warning("Alpha Vantage Error Message: %s", data["Error Message"])
         else:
-            print(f"✅ Using Alpha Vantage API key: {self.api_key[:8]}...")
+            key = "Note" if "Note" in data else "Information"
+            message = str(data[key])
+            logger.warning("Alpha Vantage %s: %s", key, message)
+            # Over quota despite the limiter (e.g. shared key or daily cap); back off until the bucket refills.
+            # "Information" also reports invalid inputs and demo-key limits, which say nothing about quota.
+            if key == "Note" or _QUOTA_RE.search(message):
+                _BUCKET.drain()
+        return None
+    
+    def _decode(self, function: str, content: bytes) -> Optional[Dict]:
+        """Parse a response body, rejecting error replies and trimming statements to what is used"""
+        data = self._check_response(orjson.loads(content))
+        if data is None:
+            return None
+        
+        kept = _KEPT_REPORTS.get(function)
+        if kept and kept[0] in data:
+            report_key, count = kept
+            data = {"symbol": data.get("symbol"), report_key: data[report_key][:count]}
+        return data
+    
+    @staticmethod
+    def _cache_key(params: Dict[str, str]) -> str:
+        key = f"av:{params['function']}:{params.get('symbol') or params.get('tickers')}"
+        return f"{key}:{params['limit']}" if "limit" in params else key
+    
+    async def _make_request_async(self, params: Dict[str, str]) -> Optional[Dict]:
+        """Make API request on the shared async client, served from the cache while fresh and refreshed in the background once stale"""
+        cache_key = self._cache_key(params)
+        cached, fresh = await _CACHE.lookup_async(cache_key)
+        if cached is not None:
+            if not fresh and _claim_refresh(cache_key):
+                task = asyncio.ensure_future(self._refresh_async(params, cache_key))
+                _BACKGROUND_TASKS.add(task)
+                task.add_done_callback(_BACKGROUND_TASKS.discard)
+            return cached
+        
+        # Concurrent misses for the same endpoint (e.g. a quote and a comprehensive fetch) share one request
+        task = _PENDING_REQUESTS.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_async(params, cache_key))
+            _PENDING_REQUESTS[cache_key] = task
+            task.add_done_callback(lambda _: _PENDING_REQUESTS.pop(cache_key, None))
+        return await asyncio.shield(task)
     
-    def _make_request(self, params: Dict[str, str]) -> Optional[Dict]:
-        """Make API request"""
+    async def _fetch_async(self, params: Dict[str, str], cache_key: str) -> Optional[Dict]:
+        if not await _BUCKET.acquire_async(RATE_LIMIT_MAX_WAIT):
+            logger.warning("Rate limit reached, skipping %s request", params['function'])
+            return None
+        
         try:
             params["apikey"] = self.api_key
-            response = requests.get(self.base_url, params=params, timeout=10)
+            response = await _ASYNC_HTTP.get(self.base_url, params=params)
             response.raise_for_status()
-            data = response.json()
-            
-            error_keys = ["Error Message", "Note", "Information"]
-            for key in error_keys:
-                if key in data and ("API call frequency" in data.get(key, "") or key == "Error Message"):
-                    print(f"Alpha Vantage {key}: {data[key]}")
-                    return None
-            
-            return data
+            data = self._decode(params["function"], response.content)
         except Exception as e:
-            print(f"Request error for {params.get('function', 'unknown')}: {e}")
+            logger.error("Request error for %s: %s", params.get('function', 'unknown'), e)
             return None
+        
+        if data:
+            await _store_async(params["function"], cache_key, data)
+        return data
+    
+    async def _refresh_async(self, params: Dict[str, str], cache_key: str) -> None:
+        try:
+            await self._fetch_async(params, cache_key)
+        finally:
+            _release_refresh(cache_key)
+    
+    @staticmethod
+    def _source_params(function: str, symbol: str) -> Dict[str, str]:
+        return {**_PARAMS_TEMPLATE[function], _SYMBOL_PARAM.get(function, "symbol"): symbol}
+    
+    def _add_source(self, result: Dict[str, Any], function: str, key: str, parser, data: Optional[Dict], symbol: str) -> None:
+        try:
+            if data:
+                parsed_data = parser(data, symbol)
+                if parsed_data:
+                    result[key] = parsed_data
+                    result["data_sources"].append(key)
+        except Exception as e:
+            logger.error("Failed to fetch %s for %s: %s", function, symbol, e)
     
-    def get_comprehensive_data(self, symbol: str) -> Dict[str, Any]:
-        """Get all available data for a symbol"""
-        symbol_upper = symbol.upper()
-        result = {"symbol": symbol_upper, "timestamp": datetime.now().isoformat(), "data_sources": []}
+    async def get_comprehensive_data_async(self, symbol: str) -> Dict[str, Any]:
+        """Get all available data for a symbol, fetching every endpoint concurrently"""
+        symbol = sys.intern(symbol.upper())
+        task = _INFLIGHT_ASYNC.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_comprehensive_data_async(symbol))
+            _INFLIGHT_ASYNC[symbol] = task
+            task.add_done_callback(lambda _: _INFLIGHT_ASYNC.pop(symbol, None))
         
-        data_sources = [
-            ("GLOBAL_QUOTE", "stock_quote", self._parse_stock_quote),
-            ("OVERVIEW", "company_overview", self._parse_company_overview),
-            ("NEWS_SENTIMENT", "news_sentiment", self._parse_news_sentiment),
-        ]
+        # Shield so one cancelled caller doesn't cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+    
+    async def _fetch_comprehensive_data_async(self, symbol: str) -> Dict[str, Any]:
+        result = {"symbol": symbol, "timestamp": datetime.now().isoformat(), "data_sources": []}
         
-        if not self.is_demo:
-            data_sources.extend([
-                ("ETF_PROFILE", "etf_profile", self._parse_etf_profile),
-                ("EARNINGS", "earnings", self._parse_earnings),
-                ("CASH_FLOW", "cash_flow", self._parse_cash_flow),
-                ("BALANCE_SHEET", "balance_sheet", self._parse_balance_sheet),
-                ("INCOME_STATEMENT", "income_statement", self._parse_income_statement)
-            ])
+        data_sources = self.data_sources
+        make_request, source_params, add_source = self._make_request_async, self._source_params, self._add_source
+        responses = await asyncio.gather(
+            *(asyncio.wait_for(make_request(source_params(function, symbol)), ENDPOINT_TIMEOUT) for function, _, _ in data_sources),
+            return_exceptions=True
+        )
         
-        for function, key, parser in data_sources:
-            try:
-                params = {"function": function, "tickers": symbol} if function == "NEWS_SENTIMENT" else {"function": function, "symbol": symbol}
-                if function == "NEWS_SENTIMENT":
-                    params["limit"] = "5"
-                
-                data = self._make_request(params)
-                if data:
-                    parsed_data = parser(data, symbol)
-                    if parsed_data:
-                        result[key] = parsed_data
-                        result["data_sources"].append(key)
-            except Exception as e:
-                print(f"Failed to fetch {function} for {symbol}: {e}")
+        # Results are merged in source order so data_sources stays deterministic
+        for (function, key, parser), data in zip(data_sources, responses):
+            if isinstance(data, Exception):
+                logger.error("Failed to fetch %s for %s: %s", function, symbol, data)
+                continue
+            add_source(result, function, key, parser, data, symbol)
         
         if not result['data_sources']:
-            self._add_mock_data(result, symbol_upper)
+            self._add_mock_data(result, symbol)
         
         return result
     
     def _add_mock_data(self, result: Dict, symbol: str) -> None:
         """Add mock data when API unavailable"""
         result["data_sources"] = ["company_overview", "news_sentiment"]
-        result["company_overview"] = {
-            "symbol": symbol, "name": f"{symbol} Corporation", "sector": "Technology",
-            "industry": "Software", "market_cap": "2500000000", "pe_ratio": "25.4"
-        }
+        result["company_overview"] = {"symbol": symbol, "name": f"{symbol} Corporation", **_MOCK_OVERVIEW}
         result["news_sentiment"] = {
             "symbol": symbol,
             "articles": [{
                 "title": f"{symbol} Shows Strong Performance",
                 "summary": f"Recent analysis shows {symbol} maintaining strong position...",
-                "sentiment": "Positive", "source": "Mock Financial News"
+                **_MOCK_ARTICLE
             }]
         }
     
@@ -108,12 +291,13 @@ class AlphaVantageClient:
         if not quote:
             return None
         
+        safe_float = self._safe_float
         return {
             "symbol": symbol,
-            "price": self._safe_float(quote.get("05. price")),
-            "change": self._safe_float(quote.get("09. change")),
-            "change_percent": quote.get("10. change percent", "0%").replace("%", ""),
-            "volume": int(float(quote.get("06. volume", 0))),
+            "price": safe_float(quote.get(_QUOTE_PRICE)),
+            "change": safe_float(quote.get(_QUOTE_CHANGE)),
+            "change_percent": quote.get(_QUOTE_CHANGE_PERCENT, "0%").translate(_PERCENT_STRIP),
+            "volume": int(float(quote.get(_QUOTE_VOLUME, 0))),
             "source": "alpha_vantage"
         }
     
@@ -121,14 +305,7 @@ class AlphaVantageClient:
         if "Symbol" not in data:
             return None
         
-        fields = {
-            "symbol": "Symbol", "name": "Name", "sector": "Sector", "industry": "Industry",
-            "market_cap": "MarketCapitalization", "pe_ratio": "PERatio", "eps": "EPS",
-            "dividend_yield": "DividendYield", "week_52_high": "52WeekHigh",
-            "week_52_low": "52WeekLow", "revenue_ttm": "RevenueTTM"
-        }
-        
-        return {key: data.get(api_key) for key, api_key in fields.items()}
+        return {key: data.get(api_key) for key, api_key in _OVERVIEW_FIELDS}
     
     def _parse_news_sentiment(self, data: Dict, symbol: str) -> Optional[Dict]:
         feed = data.get("feed")
@@ -160,7 +337,7 @@ class AlphaVantageClient:
             return None
         return {"symbol": data.get("Symbol"), "name": data.get("Name"), "expense_ratio": data.get("ExpenseRatio")}
     
-    def _parse_financial_data(self, data: Dict, symbol: str, report_key: str) -> Optional[Dict]:
+    def _parse_financial_data(self, data: Dict, symbol: str, report_key: str = "quarterlyReports") -> Optional[Dict]:
         if report_key not in data:
             return None
         reports = data[report_key]
@@ -171,68 +348,80 @@ class AlphaVantageClient:
             return None
         return {"symbol": symbol, "recent_quarters": data["quarterlyEarnings"][:4]}
     
-    def _parse_cash_flow(self, data: Dict, symbol: str) -> Optional[Dict]:
-        return self._parse_financial_data(data, symbol, "quarterlyReports")
-    
-    def _parse_balance_sheet(self, data: Dict, symbol: str) -> Optional[Dict]:
-        return self._parse_financial_data(data, symbol, "quarterlyReports")
-    
-    def _parse_income_statement(self, data: Dict, symbol: str) -> Optional[Dict]:
-        return self._parse_financial_data(data, symbol, "quarterlyReports")
-    
-    # Legacy methods
-    def get_stock_quote(self, symbol: str) -> Optional[Dict]:
-        data = self._make_request({"function": "GLOBAL_QUOTE", "symbol": symbol})
+    async def get_stock_quote_async(self, symbol: str) -> Optional[Dict]:
+        data = await self._make_request_async(self._source_params("GLOBAL_QUOTE", symbol))
         return self._parse_stock_quote(data, symbol) if data else None
     
-    def get_company_overview(self, symbol: str) -> Optional[Dict]:
-        data = self._make_request({"function": "OVERVIEW", "symbol": symbol})
-        return self._parse_company_overview(data, symbol) if data else None
+    async def get_news_sentiment_multi_async(self, symbols: List[str]) -> Dict[str, Dict]:
+        """One NEWS_SENTIMENT request for several symbols, parsed per symbol"""
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if not symbols:
+            return {}
+        
+        # Alpha Vantage ANDs the tickers filter, so every article names all the symbols; each symbol's
+        # copy differs only in its own ticker_sentiment. A single symbol shares the comprehensive fetch's cache entry.
+        data = await self._make_request_async(self._source_params("NEWS_SENTIMENT", ",".join(symbols)))
+        if not data:
+            return {}
+        parsed = ((symbol, self._parse_news_sentiment(data, symbol)) for symbol in symbols)
+        return {symbol: news for symbol, news in parsed if news}
     
-    def get_news_sentiment(self, symbol: str, limit: int = 5) -> Optional[Dict]:
-        data = self._make_request({"function": "NEWS_SENTIMENT", "tickers": symbol, "limit": str(limit)})
-        return self._parse_news_sentiment(data, symbol) if data else None
+# One shared client per process; it only holds config and resolved parsers, all connection
+# pooling lives in the module-level async client above. Built on first use, not at import, so
+# reading the key and logging about it happen once logging is configured.
+_CLIENT: Optional[AlphaVantageClient] = None
+
+def get_client() -> AlphaVantageClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = AlphaVantageClient()
+    return _CLIENT
+
+def rate_limit_tokens() -> float:
+    """Alpha Vantage requests that can be sent right now without waiting"""
+    return _BUCKET.available
 
-@lru_cache(maxsize=32)
-def create_comprehensive_context(symbol: str) -> Dict[str, Any]:
-    """Create context by fetching ALL available data for a symbol"""
-    client = AlphaVantageClient()
-    return client.get_comprehensive_data(symbol)
+async def create_comprehensive_context_async(symbol: str) -> Dict[str, Any]:
+    """Create context by fetching ALL available data for a symbol, every endpoint in parallel"""
+    return await get_client().get_comprehensive_data_async(symbol)
 
 def format_context_for_llm(context: Dict[str, Any]) -> str:
     """Format comprehensive context for LLM analysis"""
-    symbol = context["symbol"]
-    output = [f"COMPREHENSIVE MARKET DATA FOR {symbol}", f"Data Sources: {', '.join(context.get('data_sources', []))}", ""]
+    buf = [f"COMPREHENSIVE MARKET DATA FOR {context['symbol']}\nData Sources: {', '.join(context.get('data_sources', []))}\n"]
+    buf_extend = buf.extend
     
-    formatters = [
-        ("stock_quote", _format_stock_quote),
-        ("company_overview", _format_company_overview),
-        ("news_sentiment", _format_news_sentiment)
-    ]
-    
-    for key, formatter in formatters:
+    for key, formatter in _FORMATTERS:
         if key in context:
             section = formatter(context[key])
             if section:
-                output.extend(section)
-                output.append("")
+                buf_extend(section)
+                buf.append("")
     
-    return "\n".join(output)
+    financials = _format_financials(context)
+    if financials:
+        buf_extend(financials)
+        buf.append("")
+    
+    return "\n".join(buf)
+
+def format_quote_for_llm(quote: Dict, news: Optional[Dict] = None) -> str:
+    """Format a stock quote (and any news), for tickers that get no full context"""
+    lines = [f"MARKET DATA FOR {quote['symbol']}", *_format_stock_quote(quote)]
+    if news:
+        lines.extend(_format_news_sentiment(news))
+    return "\n".join(lines)
 
 def _format_stock_quote(quote: Dict) -> List[str]:
-    lines = ["CURRENT PERFORMANCE:"]
-    lines.append(f"  Price: ${quote['price']:.2f}")
-    lines.append(f"  Change: {quote['change_percent']}%")
+    section = f"CURRENT PERFORMANCE:\n  Price: ${quote['price']:.2f}\n  Change: {quote['change_percent']}%"
     if quote.get('volume'):
-        lines.append(f"  Volume: {quote['volume']:,}")
-    return lines
+        section = f"{section}\n  Volume: {quote['volume']:,}"
+    return [section]
 
 def _format_company_overview(overview: Dict) -> List[str]:
-    lines = ["COMPANY FUNDAMENTALS:"]
-    lines.extend([
-        f"  Name: {overview.get('name', 'N/A')}",
+    lines = [
+        f"COMPANY FUNDAMENTALS:\n  Name: {overview.get('name', 'N/A')}\n"
         f"  Sector: {overview.get('sector', 'N/A')} | Industry: {overview.get('industry', 'N/A')}"
-    ])
+    ]
     
     if overview.get('market_cap'):
         lines.append(f"  Market Cap: ${overview['market_cap']}")
@@ -253,12 +442,43 @@ def _format_news_sentiment(news: Dict) -> List[str]:
         if len(title) > 80:
             title = title[:80] + "..."
         
-        sentiment = article.get('overall_sentiment_label', 'Neutral')
-        source = article.get('source', 'Unknown')
-        
-        lines.extend([
-            f"    • {title}",
-            f"      Source: {source} | Sentiment: {sentiment}"
-        ])
+        lines.append(
+            f"    • {title}\n"
+            f"      Source: {article.get('source', 'Unknown')} | Sentiment: {article.get('overall_sentiment_label', 'Neutral')}"
+        )
     
     return lines
+
+# Statement sections and the (field, label) pairs reported from each latest quarter
+_FINANCIAL_FIELDS = (
+    ("income_statement", (("totalRevenue", "Revenue"), ("netIncome", "Net Income"))),
+    ("balance_sheet", (("totalAssets", "Total Assets"), ("totalLiabilities", "Total Liabilities"),
+                       ("totalShareholderEquity", "Shareholder Equity"))),
+    ("cash_flow", (("operatingCashflow", "Operating Cash Flow"), ("capitalExpenditures", "Capital Expenditures"))),
+)
+
+def _format_financials(context: Dict[str, Any]) -> List[str]:
+    """One pass over every statement's latest quarter, emitting formatted lines directly"""
+    lines = []
+    quarter_end = None
+    for section, fields in _FINANCIAL_FIELDS:
+        if section not in context:
+            continue
+        quarter = context[section]["latest_quarter"]
+        quarter_end = quarter_end or quarter.get("fiscalDateEnding")
+        for field, label in fields:
+            value = quarter.get(field)
+            if value and value != "None":
+                lines.append(f"  {label}: ${value}")
+    
+    if not lines:
+        return []
+    header = f"LATEST QUARTER FINANCIALS ({quarter_end}):" if quarter_end else "LATEST QUARTER FINANCIALS:"
+    return [header, *lines]
+
+# Section order in the LLM context; built once at import rather than per call
+_FORMATTERS = (
+    ("stock_quote", _format_stock_quote),
+    ("company_overview", _format_company_overview),
+    ("news_sentiment", _format_news_sentiment),
+)
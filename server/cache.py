@@ -0,0 +1,161 @@
+"""TTL cache for upstream API payloads: Redis when REDIS_URL is set, on-disk JSON otherwise"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def connect_redis(redis_url: str):
+    """Connect and ping, so callers can fall back to local storage if Redis is unreachable"""
+    import redis
+    client = redis.Redis.from_url(redis_url)
+    client.ping()
+    return client
+
+
+class TTLCache:
+    __slots__ = ['redis', 'cache_dir']
+
+    def __init__(self, redis_url: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.redis = None
+        self.cache_dir = Path(cache_dir or os.getenv("CACHE_DIR", ".cache"))
+
+        redis_url = redis_url or os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                self.redis = connect_redis(redis_url)
+                logger.info("✅ Caching API responses in Redis: %s", redis_url)
+            except Exception as e:
+                logger.warning("⚠️  Redis unavailable (%s) - caching API responses on disk in %s", e, self.cache_dir)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        value, fresh = self.lookup(key)
+        return value if fresh else None
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Return (value, fresh); stale values are still returned until their stale window ends"""
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(key)
+                entry = orjson.loads(raw) if raw is not None else None
+            except Exception as e:
+                logger.error("Cache read error for %s: %s", key, e)
+                return None, False
+        else:
+            try:
+                entry = orjson.loads(self._path(key).read_bytes())
+            except (OSError, orjson.JSONDecodeError):
+                return None, False
+
+        # Entries written before fetched_at was recorded are treated as misses
+        if not isinstance(entry, dict) or "fetched_at" not in entry:
+            return None, False
+
+        age = time.time() - entry["fetched_at"]
+        if age >= entry["ttl"] + entry["stale_for"]:
+            return None, False
+        return entry["value"], age < entry["ttl"]
+
+    def set(self, key: str, value: Any, ttl: int, stale_for: int = 0) -> None:
+        """Store a JSON-serializable value, fresh for ttl seconds and servable stale for stale_for more"""
+        payload = orjson.dumps({"fetched_at": time.time(), "ttl": ttl, "stale_for": stale_for, "value": value})
+
+        if self.redis is not None:
+            try:
+                self.redis.set(key, payload, ex=ttl + stale_for)
+            except Exception as e:
+                logger.error("Cache write error for %s: %s", key, e)
+            return
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(payload)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("Cache write error for %s: %s", key, e)
+
+    async def lookup_async(self, key: str) -> Tuple[Optional[Any], bool]:
+        """lookup() on a worker thread; Redis round trips and file reads would block the event loop"""
+        return await asyncio.to_thread(self.lookup, key)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        value, fresh = await self.lookup_async(key)
+        return value if fresh else None
+
+    async def set_async(self, key: str, value: Any, ttl: int, stale_for: int = 0) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl, stale_for)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+
+class MemoCache:
+    """Bounded in-process TTL cache for assembled results, with per-key locks against stampedes"""
+    __slots__ = ['maxsize', 'ttl', 'entries', 'locks']
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # Locks only live while some request is waiting on them
+        self.locks = weakref.WeakValueDictionary()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Any]], refresh: bool = False) -> Any:
+        """Return the cached value, or await factory() once for all concurrent callers of key"""
+        if refresh:
+            # Rebuild unconditionally, replacing the cached value for later callers
+            value = await factory()
+            if value is not None:
+                self.set(key, value)
+            return value
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+
+        async with lock:
+            value = self.get(key)
+            if value is None:
+                value = await factory()
+                if value is not None:
+                    self.set(key, value)
+        return value
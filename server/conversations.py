@@ -0,0 +1,99 @@
+"""Per-session conversation history: Redis lists when REDIS_URL is set, in-process otherwise"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+import orjson
+
+from .cache import connect_redis
+
+logger = logging.getLogger(__name__)
+
+
+class Turn(NamedTuple):
+    """One stored exchange; a plain tuple so appends skip model validation"""
+    timestamp: datetime
+    query: str
+    response: str
+    ticker: str
+
+
+class ConversationStore:
+    __slots__ = ['redis', 'sessions', 'max_entries', 'ttl']
+
+    def __init__(self, max_entries: int = 20, ttl: int = 60 * 60, redis_url: Optional[str] = None):
+        self.redis = None
+        self.sessions: Dict[str, Deque[Turn]] = {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        redis_url = redis_url or os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                self.redis = connect_redis(redis_url)
+                logger.info("✅ Storing conversations in Redis: %s", redis_url)
+            except Exception as e:
+                logger.warning("⚠️  Redis unavailable (%s) - storing conversations in memory", e)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"conv:{session_id}"
+
+    @staticmethod
+    def _decode(raw: bytes) -> Turn:
+        timestamp, query, response, ticker = orjson.loads(raw)
+        return Turn(datetime.fromisoformat(timestamp), query, response, ticker)
+
+    def recent(self, session_id: str, limit: int) -> List[Turn]:
+        """Return the last `limit` entries for a session, oldest first"""
+        if self.redis is not None:
+            try:
+                raw_entries = self.redis.lrange(self._key(session_id), -limit, -1)
+                return [self._decode(raw) for raw in raw_entries]
+            except Exception as e:
+                logger.error("Conversation read error for %s: %s", session_id, e)
+                return []
+
+        entries = self.sessions.get(session_id)
+        if not entries:
+            return []
+        # Index just the tail so reads cost O(limit), not O(len(session))
+        start = max(len(entries) - limit, 0)
+        return [entries[i] for i in range(start, len(entries))]
+
+    def append(self, session_id: str, entry: Turn) -> None:
+        """Store an entry, keeping only the last max_entries per session"""
+        if self.redis is not None:
+            key = self._key(session_id)
+            try:
+                # One round trip; the TTL restarts on every message so idle sessions expire
+                pipe = self.redis.pipeline()
+                pipe.rpush(key, orjson.dumps(tuple(entry)))
+                pipe.ltrim(key, -self.max_entries, -1)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.error("Conversation write error for %s: %s", session_id, e)
+            return
+
+        entries = self.sessions.get(session_id)
+        if entries is None:
+            entries = self.sessions[session_id] = deque(maxlen=self.max_entries)
+        # The bounded deque evicts the oldest entry itself
+        entries.append(entry)
+
+    # Redis calls run on a worker thread so a slow round trip never stalls the event loop;
+    # the in-memory store is touched only from the loop itself
+    async def recent_async(self, session_id: str, limit: int) -> List[Turn]:
+        if self.redis is None:
+            return self.recent(session_id, limit)
+        return await asyncio.to_thread(self.recent, session_id, limit)
+
+    async def append_async(self, session_id: str, entry: Turn) -> None:
+        if self.redis is None:
+            self.append(session_id, entry)
+            return
+        await asyncio.to_thread(self.append, session_id, entry)
@@ -0,0 +1,39 @@
+"""Process-wide logging: records go through a queue so request handlers never block on stderr"""
+import logging
+import os
+import queue
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator
+
+# HTTP client loggers whose INFO lines carry full request URLs, including the Alpha Vantage apikey
+_QUIET_LOGGERS = ("httpx", "httpcore")
+
+
+@contextmanager
+def queued_logging() -> Iterator[None]:
+    """Route root logging through a QueueHandler at LOG_LEVEL for the duration of the block"""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    # The QueueHandler is left unformatted; the listener's handler formats each record once
+    queue_handler = QueueHandler(log_queue)
+    root = logging.getLogger()
+    quiet = [logging.getLogger(name) for name in _QUIET_LOGGERS]
+    saved_levels = [(logger, logger.level) for logger in (root, *quiet)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for logger in quiet:
+        logger.setLevel(logging.WARNING)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        # Detach first so nothing is queued after the listener has drained and stopped
+        root.removeHandler(queue_handler)
+        listener.stop()
+        for logger, level in saved_levels:
+            logger.setLevel(level)
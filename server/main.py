@@ -1,167 +1,348 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import asyncio
+import hashlib
+import importlib.util
+import logging
 import os
+import httpx
 import openai
+import orjson
 import re
 import unicodedata
-from typing import Optional, List, Dict
+from types import MappingProxyType
+from typing import Optional, List, Dict, AsyncIterator, Tuple
 from datetime import datetime
 import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from .models import RoboAdvisorRequest, RoboAdvisorResponse, StructuredQuery, StockData, ConversationEntry
-from .prompts import extract_ticker_from_text, create_single_stock_analysis_prompt, create_fallback_single_stock_prompt, create_general_query_prompt
-from .alpha_vantage import AlphaVantageClient, create_comprehensive_context, format_context_for_llm
+from .log_config import queued_logging
+from .models import RoboAdvisorRequest, RoboAdvisorResponse, StructuredQuery, StockData
+from .prompts import Messages, TICKER_STOPWORDS, messages_to_bytes, extract_ticker_from_text, create_single_stock_analysis_prompt, create_multi_stock_comparison_prompt, create_fallback_single_stock_prompt, create_general_query_prompt
+from .cache import MemoCache, TTLCache
+from .conversations import ConversationStore, Turn
+from .tokens import fit_prompt
+from .prompt_cache import response_cache_key, get_cached_response, cache_response, clear_response_cache
+from .alpha_vantage import get_client as get_alpha_vantage_client, rate_limit_tokens, create_comprehensive_context_async, format_context_for_llm, format_quote_for_llm
 
-app = FastAPI(title="RoboAdvisor API")
+logger = logging.getLogger(__name__)
 
-# In-memory conversation storage (in production, use a database)
-conversation_memory: Dict[str, List[ConversationEntry]] = {}
+# Assembled quotes and (context, formatted context) pairs per ticker, so repeat questions skip
+# the per-endpoint cache, parsing and formatting. The context embeds the live quote, so both
+# follow the quote's 60s freshness.
+_QUOTE_MEMO = MemoCache(maxsize=1024, ttl=60)
+_CONTEXT_MEMO = MemoCache(maxsize=512, ttl=60)
+
+# Most tickers a single question can compare (the primary plus two more)
+MAX_COMPARE_TICKERS = 3
+
+# Conversation history per session (Redis when REDIS_URL is set, so all workers share it)
+conversation_store = ConversationStore(max_entries=20)
 
 def validate_environment_variables():
     """Validate that all required environment variables are set"""
-    print("🔍 Checking environment variables...")
+    logger.info("🔍 Checking environment variables...")
     
     # Check OpenAI API Key
     openai_key = os.getenv("OPENAI_API_KEY")
     if openai_key:
         if openai_key.startswith(('sk-', 'sk-proj-')):
-            print(f"✅ OpenAI API Key: {openai_key[:8]}...")
+            logger.info("✅ OpenAI API Key: %s...", openai_key[:8])
         else:
-            print("⚠️  OpenAI API Key format appears invalid")
+            logger.warning("⚠️  OpenAI API Key format appears invalid")
     else:
-        print("❌ OpenAI API Key: Not set")
+        logger.error("❌ OpenAI API Key: Not set")
     
     # Check Alpha Vantage API Key
     alpha_key = os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
     if alpha_key == "demo":
-        print("⚠️  Alpha Vantage API Key: Using demo (limited functionality)")
+        logger.warning("⚠️  Alpha Vantage API Key: Using demo (limited functionality)")
     else:
-        print(f"✅ Alpha Vantage API Key: {alpha_key[:8]}...")
+        logger.info("✅ Alpha Vantage API Key: %s...", alpha_key[:8])
     
     # Check API Base URL
     api_url = os.getenv("API_BASE_URL", "http://localhost:8000")
-    print(f"🔗 API Base URL: {api_url}")
+    logger.info("🔗 API Base URL: %s", api_url)
     
-    print("🚀 Environment validation complete\n")
+    logger.info("🚀 Environment validation complete")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Logging and environment validation happen on server startup, not on import.
+    # Leaving the block flushes queued log records before shutdown completes.
+    with queued_logging():
+        validate_environment_variables()
+        get_alpha_vantage_client()
+        yield
+
+# orjson-backed responses: the market-data payloads (e.g. /context) are large nested dicts
+app = FastAPI(title="RoboAdvisor API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Runs of anything outside printable ASCII/newline/tab, and the two whitespace fixes in one alternation
+_NON_PRINTABLE_RE = re.compile(r'[^\x20-\x7E\n\t]+')
+_WHITESPACE_RE = re.compile(r' +|\n\s*\n')
 
-# Validate environment on startup
-validate_environment_variables()
+def _collapse_whitespace(match: re.Match) -> str:
+    return ' ' if match.group()[0] == ' ' else '\n\n'
 
 def clean_text_response(text: str) -> str:
     """Clean and normalize text response to fix formatting issues"""
     if not text:
         return text
     
-    # Normalize unicode characters
-    text = unicodedata.normalize('NFKC', text)
+    # Normalize unicode characters (a no-op for plain ASCII, which most responses are)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text)
     
     # Remove any non-printable characters except newlines and tabs
-    text = re.sub(r'[^\x20-\x7E\n\t]', '', text)
+    text = _NON_PRINTABLE_RE.sub('', text)
     
-    # Fix multiple spaces
-    text = re.sub(r' +', ' ', text)
-    
-    # Fix line breaks
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    
-    # Strip leading/trailing whitespace
-    text = text.strip()
-    
-    return text
+    # Fix multiple spaces and line breaks in a single pass
+    return _WHITESPACE_RE.sub(_collapse_whitespace, text).strip()
 
-def get_openai_response(prompt: str, max_tokens: int = 400) -> str:
-    """Simple OpenAI API call"""
+def check_openai_api_key() -> Optional[str]:
+    """Return a user-facing error message if the OpenAI API key is missing or malformed"""
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not openai_api_key:
-        print("❌ OPENAI_API_KEY not found in environment variables")
+        logger.error("❌ OPENAI_API_KEY not found in environment variables")
         return "I'm unable to provide analysis right now. Please set the OPENAI_API_KEY environment variable."
     
     # Validate API key format
     if not openai_api_key.startswith(('sk-', 'sk-proj-')):
-        print("⚠️  OpenAI API key format seems invalid")
+        logger.warning("⚠️  OpenAI API key format seems invalid")
         return "OpenAI API key appears to be invalid. Please check your OPENAI_API_KEY environment variable."
     
+    return None
+
+OPENAI_MODEL = "gpt-4o-mini"
+
+# Prefix of the text returned when a completion fails; such responses are never cached
+LLM_UNAVAILABLE = "Analysis temporarily unavailable"
+
+class LLMStreamError(Exception):
+    """A streamed completion failed partway; the message is the user-facing error text"""
+
+# Completions keyed by (model, max_tokens, messages) hash. Shared across workers through Redis when
+# REDIS_URL is set; otherwise a bounded in-process LRU. Prompts embed live quotes, so nearly every key
+# is unique - TTLCache's on-disk fallback would leave one never-deleted file per prompt.
+LLM_CACHE_TTL = 5 * 60
+_LLM_MEMO = MemoCache(maxsize=10_000, ttl=LLM_CACHE_TTL)
+_LLM_REDIS_CACHE = TTLCache() if os.getenv("REDIS_URL") else None
+if _LLM_REDIS_CACHE is not None and _LLM_REDIS_CACHE.redis is None:
+    _LLM_REDIS_CACHE = None
+
+async def _get_cached_completion(cache_key: str) -> Optional[str]:
+    if _LLM_REDIS_CACHE is not None:
+        return await _LLM_REDIS_CACHE.get_async(cache_key)
+    return _LLM_MEMO.get(cache_key)
+
+async def _cache_completion(cache_key: str, response_text: str) -> None:
+    if _LLM_REDIS_CACHE is not None:
+        await _LLM_REDIS_CACHE.set_async(cache_key, response_text, LLM_CACHE_TTL)
+    else:
+        _LLM_MEMO.set(cache_key, response_text)
+
+# Completions currently running (blocking or streamed), keyed like the cache. Each resolves to the
+# completion text, or to None when a stream was abandoned and waiters must make their own call.
+_LLM_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+# OpenAI client built once at import so every request reuses its pooled keep-alive connections.
+# With h2 installed, concurrent completions from different requests are multiplexed as streams on
+# a shared HTTP/2 connection instead of each waiting for (or opening) a connection of its own.
+# None when the key is missing; check_openai_api_key reports that before it is used.
+_OPENAI_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+_OPENAI_CLIENT = openai.AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=openai.DefaultAsyncHttpxClient(
+        limits=_OPENAI_LIMITS, timeout=30.0, http2=importlib.util.find_spec("h2") is not None
+    )
+) if os.getenv("OPENAI_API_KEY") else None
+
+def llm_cache_key(messages: Messages, max_tokens: int) -> str:
+    digest = hashlib.blake2b(f"{OPENAI_MODEL}|{max_tokens}|".encode(), digest_size=16)
+    digest.update(messages_to_bytes(messages))
+    return f"llm:{digest.hexdigest()}"
+
+def _track_inflight(cache_key: str, future: asyncio.Future) -> None:
+    def release(done: asyncio.Future) -> None:
+        if _LLM_INFLIGHT.get(cache_key) is done:
+            del _LLM_INFLIGHT[cache_key]
+    
+    _LLM_INFLIGHT[cache_key] = future
+    future.add_done_callback(release)
+
+async def _await_inflight(cache_key: str) -> Optional[str]:
+    """Wait for an identical completion already in flight; None if there is none or it was abandoned"""
+    pending = _LLM_INFLIGHT.get(cache_key)
+    return await asyncio.shield(pending) if pending is not None else None
+
+async def get_openai_response(messages: Messages, max_tokens: int = 400, cache_bypass: bool = False) -> str:
+    """Simple OpenAI API call; identical prompts within LLM_CACHE_TTL reuse the last completion"""
+    key_error = check_openai_api_key()
+    if key_error:
+        return key_error
+    
+    cache_key = llm_cache_key(messages, max_tokens)
+    if not cache_bypass:
+        cached = await _get_cached_completion(cache_key)
+        if cached is not None:
+            return cached
+    
+    # Identical prompts already being completed or streamed by another request share that one call
+    shared = await _await_inflight(cache_key)
+    if shared is not None:
+        return shared
+    
+    task = asyncio.ensure_future(_complete_openai(messages, max_tokens, cache_key))
+    _track_inflight(cache_key, task)
+    return await asyncio.shield(task)
+
+async def _complete_openai(messages: Messages, max_tokens: int, cache_key: str) -> str:
     try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        response = await _OPENAI_CLIENT.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
             temperature=0.3,
             max_tokens=max_tokens
         )
-        response_text = response.choices[0].message.content.strip()
-        return clean_text_response(response_text)
+        response_text = clean_text_response(response.choices[0].message.content.strip())
+    except Exception as e:
+        return f"{LLM_UNAVAILABLE}: {str(e)}"
+    
+    await _cache_completion(cache_key, response_text)
+    return response_text
+
+async def stream_openai_response(messages: Messages, max_tokens: int = 400, cache_bypass: bool = False) -> AsyncIterator[str]:
+    """
+    Streaming OpenAI API call that yields raw text deltas as they are generated.
+    Raises LLMStreamError if the completion fails, possibly after some deltas were yielded.
+    Shares the completion cache and in-flight calls with get_openai_response: a cached or
+    concurrently running identical completion is yielded whole once ready, and a stream that runs
+    to completion is cached for later /chat and /chat/stream calls.
+    """
+    key_error = check_openai_api_key()
+    if key_error:
+        yield key_error
+        return
+    
+    cache_key = llm_cache_key(messages, max_tokens)
+    cached = None if cache_bypass else await _get_cached_completion(cache_key)
+    if cached is None:
+        cached = await _await_inflight(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    done = asyncio.get_running_loop().create_future()
+    _track_inflight(cache_key, done)
+    deltas = []
+    try:
+        stream = await _OPENAI_CLIENT.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                deltas.append(chunk.choices[0].delta.content)
+                yield deltas[-1]
+        response_text = clean_text_response("".join(deltas))
+        await _cache_completion(cache_key, response_text)
+        done.set_result(response_text)
     except Exception as e:
-        return f"Analysis temporarily unavailable: {str(e)}"
+        # Raised rather than yielded, so callers can tell a broken answer from a finished one
+        raise LLMStreamError(f"{LLM_UNAVAILABLE}: {str(e)}") from e
+    finally:
+        # Failed or disconnected mid-stream: release waiters to make their own call
+        if not done.done():
+            done.set_result(None)
+
+# Common patterns: $AAPL, AAPL, (AAPL), ticker symbols in caps
+_TICKER_PATTERNS = (
+    re.compile(r'\$([A-Z]{1,5})\b'),  # $AAPL format
+    re.compile(r'\b([A-Z]{2,5})\b'),  # 2-5 letter caps (but be selective)
+    re.compile(r'\(([A-Z]{1,5})\)'),  # (AAPL) format
+)
+
+# Known company name to ticker mappings for common stocks
+_COMPANY_TICKERS = MappingProxyType({
+    'apple': 'AAPL', 'microsoft': 'MSFT', 'google': 'GOOGL', 'alphabet': 'GOOGL',
+    'amazon': 'AMZN', 'tesla': 'TSLA', 'meta': 'META', 'facebook': 'META',
+    'nvidia': 'NVDA', 'netflix': 'NFLX', 'disney': 'DIS', 'walmart': 'WMT',
+    'coca cola': 'KO', 'coca-cola': 'KO', 'pepsi': 'PEP', 'mcdonalds': 'MCD',
+    'visa': 'V', 'mastercard': 'MA', 'paypal': 'PYPL', 'intel': 'INTC',
+    'amd': 'AMD', 'boeing': 'BA', 'ge': 'GE', 'general electric': 'GE'
+})
+
+# One pass over the text for every company name; longest names first so "general electric" wins over "ge"
+_COMPANY_RE = re.compile(
+    r'\b(' + '|'.join(map(re.escape, sorted(_COMPANY_TICKERS, key=len, reverse=True))) + r')\b',
+    re.IGNORECASE
+)
 
 def extract_tickers_from_text(text: str) -> List[str]:
     """Extract multiple ticker symbols from text"""
+    # Insertion-ordered dict doubles as an O(1) seen-set, so no separate dedup pass is needed
+    tickers: Dict[str, None] = {}
+    
     # First try the existing single ticker extraction
     single_ticker = extract_ticker_from_text(text)
     if single_ticker != "UNKNOWN":
-        tickers = [single_ticker]
-    else:
-        tickers = []
-    
-    # Look for additional ticker patterns
-    # Common patterns: $AAPL, AAPL, (AAPL), ticker symbols in caps
-    ticker_patterns = [
-        r'\$([A-Z]{1,5})\b',  # $AAPL format
-        r'\b([A-Z]{2,5})\b',  # 2-5 letter caps (but be selective)
-        r'\(([A-Z]{1,5})\)',  # (AAPL) format
-    ]
-    
-    # Known company name to ticker mappings for common stocks
-    company_mappings = {
-        'apple': 'AAPL', 'microsoft': 'MSFT', 'google': 'GOOGL', 'alphabet': 'GOOGL',
-        'amazon': 'AMZN', 'tesla': 'TSLA', 'meta': 'META', 'facebook': 'META',
-        'nvidia': 'NVDA', 'netflix': 'NFLX', 'disney': 'DIS', 'walmart': 'WMT',
-        'coca cola': 'KO', 'coca-cola': 'KO', 'pepsi': 'PEP', 'mcdonalds': 'MCD',
-        'visa': 'V', 'mastercard': 'MA', 'paypal': 'PYPL', 'intel': 'INTC',
-        'amd': 'AMD', 'boeing': 'BA', 'ge': 'GE', 'general electric': 'GE'
-    }
-    
-    text_lower = text.lower()
+        tickers[single_ticker] = None
     
     # Check for company names
-    for company, ticker in company_mappings.items():
-        if company in text_lower and ticker not in tickers:
-            tickers.append(ticker)
+    for match in _COMPANY_RE.finditer(text):
+        tickers.setdefault(_COMPANY_TICKERS[match.group(1).lower()])
     
     # Extract ticker patterns
-    for pattern in ticker_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            ticker = match.upper()
-            # Filter out common English words that might match ticker pattern
-            if ticker not in ['THE', 'AND', 'FOR', 'ARE', 'BUT', 'NOT', 'YOU', 'ALL', 'CAN', 'HER', 'WAS', 'ONE', 'OUR', 'OUT', 'DAY', 'GET', 'USE', 'MAN', 'NEW', 'NOW', 'WAY', 'MAY', 'SAY', 'WHAT', 'WHEN', 'WHERE', 'WHO', 'WHY', 'HOW', 'SOME', 'GOOD', 'BEST', 'TOP', 'ANY', 'WILL', 'SHOULD', 'COULD', 'WOULD'] and ticker not in tickers:
-                tickers.append(ticker)
-    
-    # Remove duplicates while preserving order
-    unique_tickers = []
-    for ticker in tickers:
-        if ticker not in unique_tickers:
-            unique_tickers.append(ticker)
-    
-    return unique_tickers if unique_tickers else ["UNKNOWN"]
-
-def get_stock_data(ticker: str) -> Optional[StockData]:
-    """Get stock data from Alpha Vantage"""
+    for pattern in _TICKER_PATTERNS:
+        for ticker in pattern.findall(text):
+            if ticker not in TICKER_STOPWORDS:
+                tickers.setdefault(ticker)
+    
+    return list(tickers) if tickers else ["UNKNOWN"]
+
+async def get_stock_data(ticker: str, refresh: bool = False) -> Optional[StockData]:
+    """Get stock data from Alpha Vantage, memoized per ticker (refresh skips the memo)"""
+    return await _QUOTE_MEMO.get_or_create(ticker.upper(), lambda: _fetch_stock_data(ticker), refresh)
+
+async def _fetch_stock_data(ticker: str) -> Optional[StockData]:
     try:
-        client = AlphaVantageClient()
-        data = client.get_stock_quote(ticker)
+        data = await get_alpha_vantage_client().get_stock_quote_async(ticker)
         return StockData(**data) if data else None
     except Exception:
         return None
 
-def get_conversation_history(session_id: str, max_entries: int = 5) -> str:
+async def get_comprehensive_context(ticker: str, refresh: bool = False) -> Tuple[Dict, str]:
+    """Comprehensive Alpha Vantage context and its LLM-formatted text, memoized per ticker (refresh skips the memo)"""
+    return await _CONTEXT_MEMO.get_or_create(ticker.upper(), lambda: _build_comprehensive_context(ticker), refresh)
+
+async def _build_comprehensive_context(ticker: str) -> Tuple[Dict, str]:
+    context = await create_comprehensive_context_async(ticker)
+    return context, format_context_for_llm(context)
+
+async def get_comparison_data(tickers: List[str], refresh: bool = False) -> List[Tuple[str, StockData, Optional[Dict]]]:
+    """Quote per ticker, then one shared news request for the tickers that turned out to be real"""
+    quotes = await asyncio.gather(*(get_stock_data(ticker, refresh) for ticker in tickers), return_exceptions=True)
+    # A quote is also the symbol check: capitalized words that aren't listed tickers get none
+    valid = [(ticker, quote) for ticker, quote in zip(tickers, quotes) if isinstance(quote, StockData)]
+    
+    news = {}
+    if valid:
+        try:
+            news = await get_alpha_vantage_client().get_news_sentiment_multi_async([ticker for ticker, _ in valid])
+        except Exception as e:
+            logger.error("Comparison news fetch failed for %s: %s", tickers, e)
+    return [(ticker, quote, news.get(ticker.upper())) for ticker, quote in valid]
+
+async def get_conversation_history(session_id: str, max_entries: int = 5) -> str:
     """Get formatted conversation history for context"""
-    if session_id not in conversation_memory:
-        return ""
-    
-    entries = conversation_memory[session_id][-max_entries:]  # Get last N entries
+    entries = await conversation_store.recent_async(session_id, max_entries)  # Get last N entries
     if not entries:
         return ""
     
@@ -174,27 +355,17 @@ def get_conversation_history(session_id: str, max_entries: int = 5) -> str:
     
     return "\n".join(history_lines)
 
-def save_conversation_entry(session_id: str, query: str, response: str, ticker: str):
+async def save_conversation_entry(session_id: str, query: str, response: str, ticker: str):
     """Save a conversation entry to memory"""
-    if session_id not in conversation_memory:
-        conversation_memory[session_id] = []
-    
-    entry = ConversationEntry(
-        timestamp=datetime.now(),
-        query=query,
-        response=response,
-        ticker=ticker
-    )
-    
-    conversation_memory[session_id].append(entry)
-    
-    # Keep only last 20 entries per session to prevent memory overflow
-    if len(conversation_memory[session_id]) > 20:
-        conversation_memory[session_id] = conversation_memory[session_id][-20:]
+    # Store keeps only the last 20 entries per session to prevent memory overflow
+    await conversation_store.append_async(session_id, Turn(datetime.now(), query, response, ticker))
+
+# Static payload encoded once at import; health checks are polled constantly
+_HEALTH_JSON = orjson.dumps({"status": "healthy", "service": "RoboAdvisor API"})
 
 @app.get("/")
 def health():
-    return {"status": "healthy", "service": "RoboAdvisor API"}
+    return Response(content=_HEALTH_JSON, media_type="application/json")
 
 @app.get("/env-status")
 def environment_status():
@@ -206,7 +377,8 @@ def environment_status():
         },
         "alpha_vantage_api_key": {
             "configured": os.getenv("ALPHA_VANTAGE_API_KEY", "demo") != "demo",
-            "using_demo": os.getenv("ALPHA_VANTAGE_API_KEY", "demo") == "demo"
+            "using_demo": os.getenv("ALPHA_VANTAGE_API_KEY", "demo") == "demo",
+            "rate_limit_tokens": round(rate_limit_tokens(), 2)
         },
         "api_base_url": os.getenv("API_BASE_URL", "http://localhost:8000")
     }
@@ -218,15 +390,22 @@ def environment_status():
     
     return status
 
+@app.post("/cache/clear")
+def clear_cache():
+    """Drop the in-process quote/context memos and shared answers (Alpha Vantage endpoint caches expire on their own TTLs)"""
+    cleared = len(_QUOTE_MEMO.entries) + len(_CONTEXT_MEMO.entries) + clear_response_cache()
+    _QUOTE_MEMO.clear()
+    _CONTEXT_MEMO.clear()
+    return {"status": "cleared", "entries": cleared}
+
 @app.get("/context/{symbol}")
-def debug_comprehensive_context(symbol: str):
+async def debug_comprehensive_context(symbol: str):
     """Debug endpoint to see what comprehensive context looks like"""
     try:
-        context = create_comprehensive_context(symbol)
-        formatted = format_context_for_llm(context)
+        context, formatted = await get_comprehensive_context(symbol)
         
         return {
-            "symbol": symbol.upper(),
+            "symbol": context["symbol"],
             "raw_context": context,
             "formatted_for_llm": formatted,
             "data_sources": context.get("data_sources", [])
@@ -234,14 +413,37 @@ def debug_comprehensive_context(symbol: str):
     except Exception as e:
         return {"error": str(e), "symbol": symbol}
 
-@app.post("/chat", response_model=RoboAdvisorResponse)
-def chat_roboadvisor(request: RoboAdvisorRequest) -> RoboAdvisorResponse:
-    query = request.query
-    session_id = request.session_id or str(uuid.uuid4())  # Generate session ID if not provided
-    
-    # Extract ticker from query (single stock only)
+async def prepare_chat(query: str, session_id: str, refresh: bool = False) -> Tuple[RoboAdvisorResponse, Optional[Messages], int, Optional[str]]:
+    """
+    Gather market data for a chat query and build the LLM prompt.
+    Returns the response (text still to be filled in), the prompt, its token budget and the key to
+    share the answer under (None when it must not be shared). The prompt is None when the response
+    text is already final, including when another session's answer to the same question is reused.
+    With refresh, market data is refetched and no shared answer is reused (the new one replaces it).
+    """
+    conversation_history = await get_conversation_history(session_id)
+    result, prompt, max_tokens = await _build_chat(query, session_id, conversation_history, refresh)
+    
+    # Only first turns are shared; later answers depend on the session's history
+    if not prompt or conversation_history or check_openai_api_key():
+        return result, prompt, max_tokens, None
+    
+    response_key = response_cache_key(result.structured_query, result.user_level, query)
+    cached = None if refresh else get_cached_response(result.structured_query, response_key)
+    if cached is not None:
+        result.response = cached
+        return result, None, 0, None
+    return result, prompt, max_tokens, response_key
+
+def remember_response(result: RoboAdvisorResponse, response_key: Optional[str]) -> None:
+    if response_key and result.response and not result.response.startswith(LLM_UNAVAILABLE):
+        cache_response(result.structured_query, response_key, result.response)
+
+async def _build_chat(query: str, session_id: str, conversation_history: str, refresh: bool = False) -> Tuple[RoboAdvisorResponse, Optional[Messages], int]:
+    # Extract tickers from query; the first is the primary stock, the rest are compared against it
     tickers = extract_tickers_from_text(query)
     primary_ticker = tickers[0] if tickers else "UNKNOWN"
+    compare_tickers = tickers[1:MAX_COMPARE_TICKERS]
     
     structured_query = StructuredQuery(
         ticker=primary_ticker if primary_ticker != "UNKNOWN" else "",
@@ -252,98 +454,146 @@ def chat_roboadvisor(request: RoboAdvisorRequest) -> RoboAdvisorResponse:
     
     # Handle unknown ticker - use general query prompt
     if primary_ticker == "UNKNOWN":
-        # Get conversation history
-        conversation_history = get_conversation_history(session_id)
+        _, conversation_history = fit_prompt(query, [], conversation_history)
         
         # Use general query prompt to let LLM handle the response
         prompt = create_general_query_prompt(query, conversation_history)
-        response_text = get_openai_response(prompt, max_tokens=600)
-        
-        save_conversation_entry(session_id, query, response_text, "")
-        return RoboAdvisorResponse(
-            response=response_text,
+        result = RoboAdvisorResponse(
+            response="",
             structured_query=structured_query,
             user_level="BEGINNER",
             stock_data=None,
             original_query=query,
             session_id=session_id
         )
+        return result, prompt, 600
     
-    # Get stock data
-    stock_data = get_stock_data(primary_ticker)
+    logger.debug("Gathering comprehensive market data for %s...", primary_ticker)
+    
+    # The primary ticker's quote and comprehensive context are fetched concurrently with the compared
+    # tickers' quotes and shared news: one rate-limited request each plus one, not one per endpoint each
+    stock_data, context_bundle, compare_data = await asyncio.gather(
+        get_stock_data(primary_ticker, refresh),
+        get_comprehensive_context(primary_ticker, refresh),
+        get_comparison_data(compare_tickers, refresh),
+        return_exceptions=True
+    )
+    if isinstance(stock_data, Exception):
+        stock_data = None
     
     if not stock_data:
-        response_text = f"Sorry, I can't get current data for {primary_ticker}. Please try another stock or check back later."
-        save_conversation_entry(session_id, query, response_text, primary_ticker)
-        return RoboAdvisorResponse(
-            response=response_text,
+        result = RoboAdvisorResponse(
+            response=f"Sorry, I can't get current data for {primary_ticker}. Please try another stock or check back later.",
             structured_query=structured_query,
             user_level="BEGINNER",
             stock_data=None,
             original_query=query,
             session_id=session_id
         )
-    
-    # Get conversation history
-    conversation_history = get_conversation_history(session_id)
-    
-    print(f"Gathering comprehensive market data for {primary_ticker}...")
+        return result, None, 0
     
     comprehensive_context = None
-    response_text = ""
     
     try:
-        # Single stock analysis with conversation history
-        comprehensive_context = create_comprehensive_context(primary_ticker)
-        formatted_context = format_context_for_llm(comprehensive_context)
+        if isinstance(context_bundle, Exception):
+            raise context_bundle
+        
+        comprehensive_context, formatted_context = context_bundle
+        
+        comparisons = [] if isinstance(compare_data, Exception) else [
+            (ticker, format_quote_for_llm(quote.model_dump(), news)) for ticker, quote, news in compare_data
+        ]
+        
+        # Oldest history and lowest-priority market data are trimmed to the prompt token budget
+        contexts, conversation_history = fit_prompt(
+            query, [formatted_context, *(context for _, context in comparisons)], conversation_history
+        )
+        formatted_context = contexts[0]
         
-        prompt = create_single_stock_analysis_prompt(query, primary_ticker, formatted_context, conversation_history)
-        response_text = get_openai_response(prompt, max_tokens=800)
+        if comparisons:
+            # Multi-stock comparison answered by a single LLM call over all contexts
+            compared = [(primary_ticker, formatted_context), *zip((ticker for ticker, _ in comparisons), contexts[1:])]
+            structured_query.query_type = "comparison"
+            structured_query.intent = f"Comparison of {', '.join(ticker for ticker, _ in compared)}"
+            prompt = create_multi_stock_comparison_prompt(query, compared, conversation_history)
+            max_tokens = 1000
+        else:
+            # Single stock analysis with conversation history
+            prompt = create_single_stock_analysis_prompt(query, primary_ticker, formatted_context, conversation_history)
+            max_tokens = 800
         
     except Exception as e:
-        print(f"Error creating comprehensive context: {e}")
+        logger.exception("Error creating comprehensive context: %s", e)
         # Fallback to basic response
+        _, conversation_history = fit_prompt(query, [], conversation_history)
         prompt = create_fallback_single_stock_prompt(query, stock_data, conversation_history)
-        response_text = get_openai_response(prompt)
-    
-    # Save conversation entry (only the LLM response)
-    save_conversation_entry(session_id, query, response_text, primary_ticker)
-    
-    # Ensure stock_data is properly formatted
-    if stock_data:
-        # Convert to dict to ensure proper serialization
-        stock_data_dict = stock_data.dict() if hasattr(stock_data, 'dict') else stock_data.model_dump() if hasattr(stock_data, 'model_dump') else stock_data
-        # Create new StockData object with clean values
-        clean_stock_data = StockData(
-            symbol=stock_data_dict.get('symbol', ''),
-            name=stock_data_dict.get('name'),
-            price=stock_data_dict.get('price', 0),
-            previous_close=stock_data_dict.get('previous_close', 0),
-            change=stock_data_dict.get('change', 0),
-            change_percent=str(stock_data_dict.get('change_percent', 'N/A')),
-            volume=stock_data_dict.get('volume', 0),
-            market_cap=stock_data_dict.get('market_cap'),
-            pe_ratio=stock_data_dict.get('pe_ratio'),
-            dividend_yield=stock_data_dict.get('dividend_yield'),
-            week_52_high=stock_data_dict.get('week_52_high'),
-            week_52_low=stock_data_dict.get('week_52_low'),
-            sector=stock_data_dict.get('sector'),
-            industry=stock_data_dict.get('industry'),
-            source=str(stock_data_dict.get('source', 'N/A')),
-            note=stock_data_dict.get('note')
-        )
-    else:
-        clean_stock_data = None
+        max_tokens = 400
     
-    return RoboAdvisorResponse(
-        response=response_text,
+    result = RoboAdvisorResponse(
+        response="",
         structured_query=structured_query,
         user_level="INTERMEDIATE",
-        stock_data=clean_stock_data,
+        stock_data=stock_data,
         comprehensive_context=comprehensive_context,
         original_query=query,
         session_id=session_id
     )
+    return result, prompt, max_tokens
+
+@app.post("/chat", response_model=RoboAdvisorResponse)
+async def chat_roboadvisor(request: RoboAdvisorRequest) -> Response:
+    query = request.query
+    session_id = request.session_id or str(uuid.uuid4())  # Generate session ID if not provided
+    
+    result, prompt, max_tokens, response_key = await prepare_chat(query, session_id, request.refresh)
+    if prompt:
+        result.response = await get_openai_response(prompt, max_tokens=max_tokens, cache_bypass=request.refresh)
+        remember_response(result, response_key)
+    
+    # Save conversation entry (only the LLM response)
+    await save_conversation_entry(session_id, query, result.response, result.structured_query.ticker)
+    
+    # Serialized straight from pydantic-core; returning the model would have FastAPI re-validate
+    # and re-encode the (large) comprehensive_context on the way out
+    return Response(content=result.model_dump_json(by_alias=True), media_type="application/json")
+
+@app.post("/chat/stream")
+async def chat_roboadvisor_stream(request: RoboAdvisorRequest) -> StreamingResponse:
+    """
+    Server-sent events variant of /chat: streams `data: {"delta": ...}` text chunks
+    as the LLM generates them, then a final `done` event carrying the full /chat response
+    """
+    query = request.query
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    result, prompt, max_tokens, response_key = await prepare_chat(query, session_id, request.refresh)
+    
+    async def events() -> AsyncIterator[str]:
+        chunks = []
+        completed = False
+        try:
+            if prompt:
+                try:
+                    async for delta in stream_openai_response(prompt, max_tokens=max_tokens, cache_bypass=request.refresh):
+                        chunks.append(delta)
+                        yield f"data: {orjson.dumps({'delta': delta}).decode()}\n\n"
+                    completed = True
+                except LLMStreamError as e:
+                    chunks.append(str(e))
+                    yield f"data: {orjson.dumps({'delta': str(e)}).decode()}\n\n"
+            else:
+                chunks.append(result.response)
+                yield f"data: {orjson.dumps({'delta': result.response}).decode()}\n\n"
+        finally:
+            # Save whatever was generated, even if the client disconnected mid-stream
+            result.response = clean_text_response("".join(chunks))
+            await save_conversation_entry(session_id, query, result.response, result.structured_query.ticker)
+        # Only a stream that finished without error may become the shared answer
+        if completed:
+            remember_response(result, response_key)
+        yield f"event: done\ndata: {result.model_dump_json(by_alias=True)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Literal, Dict, Any, List
 from datetime import datetime
 
@@ -12,6 +12,8 @@ class ConversationEntry(BaseModel):
 class RoboAdvisorRequest(BaseModel):
     query: str = Field(..., min_length=1)
     session_id: Optional[str] = None
+    # Skip the server's cached market data and answers, e.g. for the UI's Refresh button
+    refresh: bool = False
 
 
 # Structured output schemas for OpenAI
@@ -51,13 +53,7 @@ class StockData(BaseModel):
     source: str
     note: Optional[str] = None
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {
-            float: lambda v: v if v is not None else 0,
-            int: lambda v: v if v is not None else 0,
-            str: lambda v: v if v is not None else "N/A"
-        }
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class RoboAdvisorResponse(BaseModel):
@@ -68,10 +64,3 @@ class RoboAdvisorResponse(BaseModel):
     comprehensive_context: Optional[Dict[str, Any]] = None
     original_query: str
     session_id: Optional[str] = None
-    
-    class Config:
-        json_encoders = {
-            float: lambda v: v if v is not None else 0,
-            int: lambda v: v if v is not None else 0,
-            str: lambda v: v if v is not None else "N/A"
-        }
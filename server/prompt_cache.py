@@ -0,0 +1,41 @@
+"""Answers shared across sessions, keyed by the structured query rather than the exact prompt"""
+import re
+from typing import Optional
+
+from .cache import MemoCache
+from .models import StructuredQuery
+
+# Stock answers quote live prices, so they follow the quote's freshness; general questions keep longer
+RESPONSE_TTLS = {"analysis": 60, "comparison": 60, "general": 15 * 60}
+_CACHES = {query_type: MemoCache(maxsize=10_000, ttl=ttl) for query_type, ttl in RESPONSE_TTLS.items()}
+
+_WORD_RE = re.compile(r'[a-z0-9&$]+')
+
+
+def _cache_for(structured_query: StructuredQuery) -> MemoCache:
+    if not structured_query.ticker:
+        return _CACHES["general"]
+    return _CACHES.get(structured_query.query_type, _CACHES["analysis"])
+
+
+def response_cache_key(structured_query: StructuredQuery, user_level: str, query: str) -> str:
+    """Same tickers, query type, time frame and level, asked in the same words (case and punctuation ignored)"""
+    words = " ".join(_WORD_RE.findall(query.lower()))
+    # The intent names every compared ticker, not just the primary one
+    sq = structured_query
+    return "|".join((sq.ticker, sq.intent, sq.query_type, sq.time_frame, user_level, words))
+
+
+def get_cached_response(structured_query: StructuredQuery, key: str) -> Optional[str]:
+    return _cache_for(structured_query).get(key)
+
+
+def cache_response(structured_query: StructuredQuery, key: str, response: str) -> None:
+    _cache_for(structured_query).set(key, response)
+
+
+def clear_response_cache() -> int:
+    cleared = sum(len(cache.entries) for cache in _CACHES.values())
+    for cache in _CACHES.values():
+        cache.clear()
+    return cleared
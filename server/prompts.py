@@ -1,6 +1,11 @@
 """
 Prompts and prompt templates for the roboadvisor system
 """
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
 
 # Agent 1: Query Structuring Agent
 QUERY_STRUCTURING_SYSTEM = """You are a financial query analysis agent. Extract structured information from natural language queries about stocks.
@@ -49,7 +54,7 @@ Examples:
 USER_COMPLEXITY_USER = """Assess complexity level for: "{query}"""""
 
 # Master Response Agent
-MASTER_RESPONSE_SYSTEM = """You are an experienced wealth advisor with 15+ years in financial markets. You have a warm, professional personality and genuinely care about helping clients make informed investment decisions. 
+MASTER_RESPONSE_SYSTEM_VERBOSE = """You are an experienced wealth advisor with 15+ years in financial markets. You have a warm, professional personality and genuinely care about helping clients make informed investment decisions. 
 
 Your communication style:
 - Conversational and approachable, like talking to a trusted friend
@@ -90,6 +95,37 @@ ADVANCED:
 
 Always remember: You're not just reporting data - you're providing wisdom, context, and guidance."""
 
+# Same guidance in about half the tokens; it is sent with every analysis request
+MASTER_RESPONSE_SYSTEM_COMPACT = """You are a warm, professional wealth advisor with 15+ years in financial markets, helping clients make informed investment decisions.
+
+STYLE: conversational, like a trusted friend; explain why things matter; analogies when helpful; enthusiasm for opportunities, caution on risks; forward-looking.
+ANALYSIS: use all data provided - trends, historical context, drivers of price moves, risk vs. opportunity, actionable insights.
+Match the response style given for the client's experience level.
+
+Provide wisdom, context and guidance, not just data."""
+
+# Only the client's own level is sent, in the user message, instead of all three in the system prompt
+_LEVEL_GUIDANCE = MappingProxyType({
+    "BEGINNER": "everyday terms and analogies, 2-3 key takeaways, end with next steps or what to watch",
+    "INTERMEDIATE": "data-driven with clear explanations, comparisons, opportunities and risks, what to monitor",
+    "ADVANCED": "nuanced metrics and market dynamics, sector trends, competitive positioning, technical and fundamental analysis, strategy",
+})
+
+def level_guidance(user_level: str) -> str:
+    return _LEVEL_GUIDANCE.get(user_level, _LEVEL_GUIDANCE["INTERMEDIATE"])
+
+# VERBOSE_SYSTEM_PROMPT=1 restores the original long-form system prompt
+VERBOSE_SYSTEM_PROMPT = os.getenv("VERBOSE_SYSTEM_PROMPT", "").lower() in ("1", "true", "yes")
+MASTER_RESPONSE_SYSTEM = MASTER_RESPONSE_SYSTEM_VERBOSE if VERBOSE_SYSTEM_PROMPT else MASTER_RESPONSE_SYSTEM_COMPACT
+
+# Shared by the analysis templates below
+_SINGLE_STOCK_POINTS = """1. PRICE ACTION: What's the current market telling us?
+2. FUNDAMENTALS: How strong is the underlying business?
+3. NEWS & SENTIMENT: What's driving recent movements?
+4. MARKET POSITION: How does this fit in the broader market?"""
+
+_SYNTHESIS_NOTE = """Use the news sentiment, fundamental metrics, and market data to give a well-rounded perspective. Don't just report data - synthesize it into actionable investment wisdom. Make it conversational and insightful."""
+
 MASTER_RESPONSE_USER = """A client just asked: "{original_query}"
 
 CLIENT PROFILE:
@@ -101,20 +137,14 @@ COMPREHENSIVE MARKET DATA & ANALYSIS:
 
 As their trusted wealth advisor, analyze ALL this data comprehensively:
 
-1. PRICE ACTION: What's the current market telling us?
-2. FUNDAMENTALS: How strong is the underlying business?
-3. NEWS & SENTIMENT: What's driving recent movements?
-4. MARKET POSITION: How does this fit in the broader market?
+""" + _SINGLE_STOCK_POINTS + """
 
-RESPONSE STYLE by experience level:
-- BEGINNER: Be encouraging, explain concepts simply, use analogies, focus on key takeaways
-- INTERMEDIATE: Provide balanced analysis with context, professional but friendly tone
-- ADVANCED: Deep technical and fundamental analysis, strategic investment implications
+RESPONSE STYLE: {level_guidance}
 
-Use the news sentiment, fundamental metrics, and market data to give a well-rounded perspective. Don't just report data - synthesize it into actionable investment wisdom. Make it conversational and insightful."""
+""" + _SYNTHESIS_NOTE
 
-# Company name to ticker mapping for common cases
-COMPANY_TO_TICKER = {   
+# Company name to ticker mapping for common cases (read-only view; the lookup index below is built from it)
+COMPANY_TO_TICKER = MappingProxyType({
     "apple": "AAPL",
     "tesla": "TSLA", 
     "microsoft": "MSFT",
@@ -149,89 +179,84 @@ COMPANY_TO_TICKER = {
     "qqq": "QQQ",
     "dow": "DIA",
     "russell": "IWM"
-}
+})
+
+# Common English words that look like tickers when typed in capitals
+TICKER_STOPWORDS = frozenset({'THE', 'AND', 'FOR', 'ARE', 'BUT', 'NOT', 'YOU', 'ALL', 'CAN', 'HER', 'WAS', 'ONE', 'OUR', 'OUT', 'DAY', 'GET', 'USE', 'MAN', 'NEW', 'NOW', 'WAY', 'MAY', 'SAY', 'WHAT', 'WHEN', 'WHERE', 'WHO', 'WHY', 'HOW', 'SOME', 'GOOD', 'BEST', 'TOP', 'ANY', 'WILL', 'SHOULD', 'COULD', 'WOULD'})
+# Finance acronyms that read like tickers ("Compare AAPL vs MSFT for my IRA")
+TICKER_STOPWORDS |= {'IRA', 'ROTH', 'ETF', 'CEO', 'CFO', 'IPO', 'EPS', 'ROI', 'GDP', 'CPI', 'USD', 'SEC', 'FED', 'APR', 'APY', 'YTD'}
+
+# Exact ticker mentions (2-5 uppercase letters), compiled once at import
+_TICKER_RE = re.compile(r'\b([A-Z]{2,5})\b')
+
+# Company names indexed by their first word, so each query word is one dict probe and "amd" no longer
+# matches inside "amdahl". Each entry lists (remaining words, ticker), longest name first; single-word
+# names have no remaining words.
+_WORD_RE = re.compile(r'[a-z&0-9]+')
 
+def _build_company_index() -> Dict[str, Tuple[Tuple[Tuple[str, ...], str], ...]]:
+    index = {}
+    for company, ticker in COMPANY_TO_TICKER.items():
+        first, *rest = _WORD_RE.findall(company)
+        index.setdefault(first, []).append((tuple(rest), ticker))
+    return {word: tuple(sorted(names, key=lambda name: len(name[0]), reverse=True)) for word, names in index.items()}
+
+_COMPANY_INDEX = MappingProxyType(_build_company_index())
+
+# Pure function of the query; common phrasings recur, so repeats are a single hash lookup
+@lru_cache(maxsize=4096)
 def extract_ticker_from_text(query: str) -> str:
     """
     Simple fallback ticker extraction using keyword matching
     """
     query_lower = query.lower()
     
-    # Common English words to filter out
-    english_words = {'THE', 'AND', 'FOR', 'ARE', 'BUT', 'NOT', 'YOU', 'ALL', 'CAN', 'HER', 'WAS', 'ONE', 'OUR', 'OUT', 'DAY', 'GET', 'USE', 'MAN', 'NEW', 'NOW', 'WAY', 'MAY', 'SAY', 'WHAT', 'WHEN', 'WHERE', 'WHO', 'WHY', 'HOW', 'SOME', 'GOOD', 'BEST', 'TOP', 'ANY', 'WILL', 'SHOULD', 'COULD', 'WOULD'}
-    
-    # Check for exact ticker mentions (3-5 uppercase letters)
-    import re
-    ticker_pattern = r'\b([A-Z]{2,5})\b'
-    matches = re.findall(ticker_pattern, query)
-    if matches:
-        # Filter out common English words
-        for match in matches:
-            if match not in english_words:
-                return match
-    
-    # Check company name mappings
-    for company, ticker in COMPANY_TO_TICKER.items():
-        if company in query_lower:
+    # Check for exact ticker mentions, filtering out common English words; stops at the first hit
+    for match in _TICKER_RE.finditer(query):
+        ticker = match.group(1)
+        if ticker not in TICKER_STOPWORDS:
             return ticker
     
-    return "UNKNOWN"
-
-def create_single_stock_analysis_prompt(query: str, ticker: str, context: str, conversation_history: str = None) -> str:
-    """
-    Create a comprehensive single stock analysis prompt with conversation history
-    """
-    history_section = ""
-    if conversation_history:
-        history_section = f"\n\nCONVERSATION HISTORY:\n{conversation_history}\n\nNOTE: Reference previous discussions when relevant, but focus primarily on the current query."
+    # Check company name mappings, first mentioned wins
+    words = _WORD_RE.findall(query_lower)
+    for i, word in enumerate(words):
+        for rest, ticker in _COMPANY_INDEX.get(word, ()):
+            if not rest or tuple(words[i + 1:i + 1 + len(rest)]) == rest:
+                return ticker
     
-    return f"""System: {MASTER_RESPONSE_SYSTEM}
+    return "UNKNOWN"
 
-    User: A client just asked: "{query}"
+# Prompt builders return chat messages: a static system message first, then the conversation
+# history as its own message, then the per-request user message. The system text is identical for
+# every call of a builder, and history only grows at its end between turns of a session, so OpenAI's
+# automatic prefix caching can reuse both. Within the user message the fixed labels and market data
+# (identical for every question on a ticker while the quote is fresh) precede the query, which is last.
+Messages = List[Dict[str, str]]
 
-    CLIENT PROFILE:
-    - Experience Level: INTERMEDIATE
-    - What they want to know: {ticker} analysis
+SINGLE_STOCK_ANALYSIS_SYSTEM = f"""{MASTER_RESPONSE_SYSTEM}
 
-    COMPREHENSIVE MARKET DATA & ANALYSIS:
-    {context}{history_section}
+As the client's trusted wealth advisor, analyze ALL the market data you are given comprehensively:
 
-    As their trusted wealth advisor, analyze ALL this data comprehensively:
+{_SINGLE_STOCK_POINTS}
 
-    1. PRICE ACTION: What's the current market telling us?
-    2. FUNDAMENTALS: How strong is the underlying business?
-    3. NEWS & SENTIMENT: What's driving recent movements?
-    4. MARKET POSITION: How does this fit in the broader market?
+{_SYNTHESIS_NOTE}"""
 
-    Use the news sentiment, fundamental metrics, and market data to give a well-rounded perspective. Don't just report data - synthesize it into actionable investment wisdom. Make it conversational and insightful."""
+MULTI_STOCK_COMPARISON_SYSTEM = f"""{MASTER_RESPONSE_SYSTEM}
 
-def create_fallback_single_stock_prompt(query: str, stock_data, conversation_history: str = None) -> str:
-    """
-    Create a basic single stock prompt when comprehensive data is unavailable
-    """
-    history_section = ""
-    if conversation_history:
-        history_section = f"\n\nConversation History:\n{conversation_history}\n\nNote: Reference previous discussions when relevant."
-    
-    return f"""System: You are a helpful financial advisor. Provide a clear analysis based on the available stock data.
+As the client's trusted wealth advisor, compare the stocks you are given side by side:
 
-User query: "{query}"
+1. PRICE ACTION: How is each one trading right now?
+2. FUNDAMENTALS: Which underlying business looks stronger, and why?
+3. NEWS & SENTIMENT: What's driving each one's recent movements?
+4. FIT: How might each fit in a portfolio, and what are the trade-offs?
 
-Available stock data: {stock_data}{history_section}
+{_SYNTHESIS_NOTE}"""
 
-Please provide a helpful analysis of this stock based on the available information."""
+FALLBACK_SINGLE_STOCK_SYSTEM = """You are a helpful financial advisor. Provide a clear analysis based on the available stock data.
 
-def create_general_query_prompt(query: str, conversation_history: str = None) -> str:
-    """
-    Create a prompt for handling general queries that don't specify a ticker
-    """
-    history_section = ""
-    if conversation_history:
-        history_section = f"\n\nConversation History:\n{conversation_history}\n\nNote: Reference previous discussions when relevant."
-    
-    return f"""You are an experienced wealth advisor. The user has asked a general financial question that doesn't specify a particular stock or ticker symbol.
+Please provide a helpful analysis of the stock based on the available information."""
 
-User query: "{query}"{history_section}
+GENERAL_QUERY_SYSTEM = """You are an experienced wealth advisor. The user has asked a general financial question that doesn't specify a particular stock or ticker symbol.
 
 Please respond helpfully by:
 1. If the query is asking for general financial advice, market outlook, or investment strategies, provide useful information
@@ -240,4 +265,83 @@ Please respond helpfully by:
 
 Be conversational, helpful, and professional. Guide them toward more specific questions if needed."""
 
+# System messages built once at import and shared by every request; nothing downstream mutates them
+_SINGLE_STOCK_SYSTEM_MESSAGE = {"role": "system", "content": SINGLE_STOCK_ANALYSIS_SYSTEM}
+_MULTI_STOCK_SYSTEM_MESSAGE = {"role": "system", "content": MULTI_STOCK_COMPARISON_SYSTEM}
+_FALLBACK_SYSTEM_MESSAGE = {"role": "system", "content": FALLBACK_SINGLE_STOCK_SYSTEM}
+_GENERAL_QUERY_SYSTEM_MESSAGE = {"role": "system", "content": GENERAL_QUERY_SYSTEM}
+
+# Static system prompts encoded once; hashing a prompt then only encodes its per-request messages
+_ENCODED_SYSTEM_PROMPTS = {
+    message["content"]: message["content"].encode()
+    for message in (_SINGLE_STOCK_SYSTEM_MESSAGE, _MULTI_STOCK_SYSTEM_MESSAGE, _FALLBACK_SYSTEM_MESSAGE, _GENERAL_QUERY_SYSTEM_MESSAGE)
+}
+
+def messages_to_bytes(messages: Messages) -> bytes:
+    """Encode messages into one unambiguous byte string, reusing the pre-encoded system prompts"""
+    parts = []
+    for message in messages:
+        content = message["content"]
+        encoded = _ENCODED_SYSTEM_PROMPTS.get(content) or content.encode()
+        parts.extend((message["role"].encode(), b"\x00", encoded, b"\x1e"))
+    return b"".join(parts)
+
+_ANALYSIS_HISTORY_NOTE = "NOTE: Reference previous discussions when relevant, but focus primarily on the current query.\n\nCONVERSATION HISTORY:\n"
+_BRIEF_HISTORY_NOTE = "Note: Reference previous discussions when relevant.\n\nConversation History:\n"
+
+# The same history string is formatted again on every turn until the next entry is saved
+@lru_cache(maxsize=256)
+def _format_history(conversation_history: Optional[str], note: str = _ANALYSIS_HISTORY_NOTE) -> str:
+    return note + conversation_history if conversation_history else ""
+
+def _messages(system_message: Dict[str, str], user: str, history_section: str = "") -> Messages:
+    messages = [system_message]
+    if history_section:
+        messages.append({"role": "user", "content": history_section})
+    messages.append({"role": "user", "content": user})
+    return messages
+
+def create_single_stock_analysis_prompt(query: str, ticker: str, context: str, conversation_history: str = None, user_level: str = "INTERMEDIATE") -> Messages:
+    """
+    Create a comprehensive single stock analysis prompt with conversation history
+    """
+    return _messages(_SINGLE_STOCK_SYSTEM_MESSAGE, f"""CLIENT PROFILE:
+- Experience Level: {user_level}
+- Response style: {level_guidance(user_level)}
+- What they want to know: {ticker} analysis
 
+COMPREHENSIVE MARKET DATA & ANALYSIS:
+{context}
+
+The client just asked: "{query}\"""", _format_history(conversation_history))
+
+def create_multi_stock_comparison_prompt(query: str, stocks: list, conversation_history: str = None, user_level: str = "INTERMEDIATE") -> Messages:
+    """
+    Create one comparison prompt over several stocks' (ticker, formatted context) pairs
+    """
+    tickers = ", ".join(ticker for ticker, _ in stocks)
+    market_data = "\n\n".join(context for _, context in stocks)
+    
+    return _messages(_MULTI_STOCK_SYSTEM_MESSAGE, f"""CLIENT PROFILE:
+- Experience Level: {user_level}
+- Response style: {level_guidance(user_level)}
+- What they want to know: comparison of {tickers}
+
+COMPREHENSIVE MARKET DATA & ANALYSIS:
+{market_data}
+
+The client just asked: "{query}\"""", _format_history(conversation_history))
+
+def create_fallback_single_stock_prompt(query: str, stock_data, conversation_history: str = None) -> Messages:
+    """
+    Create a basic single stock prompt when comprehensive data is unavailable
+    """
+    return _messages(_FALLBACK_SYSTEM_MESSAGE, f"""Available stock data: {stock_data}
+
+User query: "{query}\"""", _format_history(conversation_history, _BRIEF_HISTORY_NOTE))
+
+def create_general_query_prompt(query: str, conversation_history: str = None) -> Messages:
+    """
+    Create a prompt for handling general queries that don't specify a ticker
+    """
+    return _messages(_GENERAL_QUERY_SYSTEM_MESSAGE, f'User query: "{query}"', _format_history(conversation_history, _BRIEF_HISTORY_NOTE))
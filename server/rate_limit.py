@@ -0,0 +1,52 @@
+"""Token-bucket rate limiter for keeping upstream API calls inside their published quota"""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    __slots__ = ['rate', 'capacity', 'tokens', 'updated_at', 'lock']
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire_async(self, timeout: float) -> bool:
+        """Wait until a token is available without blocking the event loop; False if that would take longer than timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the upstream reports we are over quota"""
+        with self.lock:
+            self._refill()
+            self.tokens = 0.0
+
+    @property
+    def available(self) -> float:
+        with self.lock:
+            self._refill()
+            return self.tokens
@@ -0,0 +1,78 @@
+"""Token counting and prompt budgeting, so prompts sent to OpenAI stay a bounded size"""
+import logging
+import re
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tokens allowed for the query, market data and history together (the fixed template comes on top)
+PROMPT_TOKEN_BUDGET = 4000
+
+# Sections that format_context_for_llm always leads with (header, current performance); never trimmed
+_CONTEXT_KEPT_SECTIONS = 2
+_SECTION_SEP = "\n\n"
+# Split between history entries, keeping each entry whole
+_HISTORY_SPLIT_RE = re.compile(r"(?<=---\n)(?=Previous Query: )")
+
+# Sentinel until the first count; a cold tiktoken cache downloads the BPE file, so it is never loaded at import
+_UNLOADED = object()
+_ENC = _UNLOADED
+
+
+def _encoding():
+    """The gpt-4o-mini encoding, loaded once on first use; None if tiktoken or its data is unavailable"""
+    global _ENC
+    if _ENC is _UNLOADED:
+        try:
+            import tiktoken
+            _ENC = tiktoken.encoding_for_model("gpt-4o-mini")
+        except Exception as e:
+            _ENC = None
+            logger.info("tiktoken unavailable (%s) - estimating prompt tokens from length", e)
+    return _ENC
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    # About four characters per token for English text
+    return len(text) // 4 + 1
+
+
+def fit_prompt(query: str, contexts: List[str], history: str, budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[List[str], str]:
+    """
+    Trim history and market data until query + contexts + history fit the token budget.
+    Oldest history entries go first, then the trailing (lowest-priority) context sections.
+    Trimming is deterministic, so identical inputs still produce identical prompts for the LLM cache.
+    """
+    context_sections = [context.split(_SECTION_SEP) for context in contexts]
+    section_tokens = [[count_tokens(section) for section in sections] for sections in context_sections]
+    history_entries = _HISTORY_SPLIT_RE.split(history) if history else []
+    history_tokens = [count_tokens(entry) for entry in history_entries]
+
+    used = count_tokens(query) + sum(map(sum, section_tokens)) + sum(history_tokens)
+    if used <= budget:
+        return contexts, history
+
+    # The newest exchange is the one the user is most likely following up on
+    while used > budget and len(history_entries) > 1:
+        history_entries.pop(0)
+        used -= history_tokens.pop(0)
+
+    # Take the last section from whichever context is currently largest
+    while used > budget:
+        trimmable = [i for i, sections in enumerate(context_sections) if len(sections) > _CONTEXT_KEPT_SECTIONS]
+        if not trimmable:
+            break
+        i = max(trimmable, key=lambda i: sum(section_tokens[i]))
+        context_sections[i].pop()
+        used -= section_tokens[i].pop()
+
+    logger.debug("Prompt trimmed to ~%d tokens (budget %d)", used, budget)
+    return [_SECTION_SEP.join(sections) for sections in context_sections], "".join(history_entries)
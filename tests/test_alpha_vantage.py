@@ -0,0 +1,72 @@
+"""Alpha Vantage reply handling: quota and error notes must never reach the cache"""
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import orjson
+
+from server import alpha_vantage
+from server.cache import TTLCache
+
+DAILY_LIMIT_BODY = orjson.dumps({
+    "Information": "We have detected your API key as DEMO123 and our standard API rate limit is 25 requests per day. "
+                   "Please subscribe to any of the premium plans at https://www.alphavantage.co/premium/ to instantly remove all daily rate limits."
+})
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class DecodeTest(unittest.TestCase):
+    def setUp(self):
+        self.client = alpha_vantage.AlphaVantageClient()
+        self.bucket = alpha_vantage.TokenBucket(rate=5 / 60, capacity=5)
+        patcher = mock.patch.object(alpha_vantage, "_BUCKET", self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_daily_limit_information_is_rejected(self):
+        self.assertIsNone(self.client._decode("OVERVIEW", DAILY_LIMIT_BODY))
+        self.assertLess(self.bucket.available, 1)
+
+    def test_minute_limit_note_is_rejected(self):
+        body = orjson.dumps({"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."})
+        self.assertIsNone(self.client._decode("GLOBAL_QUOTE", body))
+        self.assertLess(self.bucket.available, 1)
+
+    def test_error_message_is_rejected_without_draining(self):
+        body = orjson.dumps({"Error Message": "Invalid API call."})
+        self.assertIsNone(self.client._decode("GLOBAL_QUOTE", body))
+        self.assertEqual(self.bucket.available, 5)
+
+    def test_invalid_input_information_is_rejected_without_draining(self):
+        body = orjson.dumps({"Information": "Invalid inputs. Please refer to the API documentation and try again."})
+        self.assertIsNone(self.client._decode("NEWS_SENTIMENT", body))
+        self.assertEqual(self.bucket.available, 5)
+
+    def test_data_passes_through(self):
+        body = orjson.dumps({"Global Quote": {"01. symbol": "AAPL", "05. price": "190.10"}})
+        self.assertEqual(self.client._decode("GLOBAL_QUOTE", body)["Global Quote"]["05. price"], "190.10")
+
+    def test_daily_limit_reply_is_not_cached(self):
+        cache = TTLCache(cache_dir=tempfile.mkdtemp())
+        cache.redis = None
+        http = mock.Mock()
+        http.get = mock.AsyncMock(return_value=FakeResponse(DAILY_LIMIT_BODY))
+        params = self.client._source_params("OVERVIEW", "AAPL")
+
+        with mock.patch.object(alpha_vantage, "_CACHE", cache), mock.patch.object(alpha_vantage, "_ASYNC_HTTP", http):
+            data = asyncio.run(self.client._make_request_async(params))
+
+        self.assertIsNone(data)
+        self.assertEqual(cache.lookup("av:OVERVIEW:AAPL"), (None, False))
+
+
+if __name__ == "__main__":
+    unittest.main()